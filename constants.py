@@ -1,4 +1,5 @@
 # constants.py
+import os
 DEFAULT_COLORS = [
     [78, 101, 148],  # 钢蓝 (冷轧钢色)
     [191, 87, 0],    # 氧化铁红
@@ -18,6 +19,50 @@ DEFAULT_COLORS = [
     [194, 178, 128]   # 哑光金
 ]
 
+# 面数超过该值时分批渐进显示
+PROGRESSIVE_DISPLAY_THRESHOLD = 2000
+# 渐进显示时每批占用事件循环的时间(秒)
+DISPLAY_CHUNK_SECONDS = 0.03
+
+# 网格弦高误差(相对于模型包围盒对角线)，首次显示用粗网格，之后在后台细化
+COARSE_MESH_DEFLECTION = 0.005
+FINE_MESH_DEFLECTION = 0.001
+MESH_ANGULAR_DEFLECTION = 0.5
+# 显示完成后等待多久开始细化(毫秒)，以及每次并行细化的面数
+MESH_REFINE_DELAY_MS = 1500
+MESH_REFINE_BATCH = 64
+# 缓存最近解析的STEP形状数量
+SHAPE_CACHE_SIZE = 4
+# 缓存最近显示的分割场景(形状、网格、AIS对象、标签)，用于快速切换历史记录
+SCENE_CACHE_SIZE = 4
+SCENE_CACHE_BUDGET_MB = 512
+
+# 历史记录数据库，保留的记录数可用环境变量CAD_SEGMENTATION_HISTORY_LIMIT修改(0表示不限制)
+HISTORY_DB_PATH = os.path.join(os.path.expanduser("~"), ".cad_segmentation_history.db")
+LEGACY_HISTORY_PATH = os.path.join(os.path.expanduser("~"), ".cad_segmentation_history.json")
+
+
+def _env_int(name, default):
+    """读取整数环境变量，未设置或无法解析时返回默认值"""
+    try:
+        return int(os.environ.get(name, default))
+    except (TypeError, ValueError):
+        print(f"环境变量{name}不是整数，使用默认值{default}")
+        return default
+
+
+HISTORY_MAX_RECORDS = _env_int("CAD_SEGMENTATION_HISTORY_LIMIT", 500)
+# 历史记录对话框每次从数据库读取的行数
+HISTORY_PAGE_SIZE = 100
+
+# 按几何哈希缓存的面采样特征，修改后的零件只重新采样变化的面
+FEATURE_CACHE_PATH = os.path.join(os.path.expanduser("~"), ".cad_segmentation_features.db")
+FEATURE_CACHE_MAX_FACES = 200000
+# 数据库被其他线程或进程锁定时等待的秒数
+FEATURE_CACHE_BUSY_TIMEOUT = 5.0
+# 批量处理时合并为一次推理的零件总面数上限
+BATCH_INFERENCE_MAX_FACES = 50000
+
 STYLESHEET = """
 /* 基础样式 */
 QWidget {
@@ -170,24 +215,24 @@ QLabel#drop_label {
 }
 
 /* 面列表样式 */
-QListWidget {
+QListWidget, QListView {
     border: 1px solid #d1d9e6;
     border-radius: 4px;
     background: white;
     padding: 2px;
 }
-QListWidget::item {
+QListWidget::item, QListView::item {
     padding: 5px;
     border-bottom: 1px solid #eee;
 }
-QListWidget::item:hover {
+QListWidget::item:hover, QListView::item:hover {
     background: #e3f2fd;
 }
-QListWidget::item:selected {
+QListWidget::item:selected, QListView::item:selected {
     background: #bbdefb;
     color: black;
 }
-QListWidget::item:selected:active {
+QListWidget::item:selected:active, QListView::item:selected:active {
     background: #90caf9;
 }
 """
@@ -214,8 +259,11 @@ LANGUAGE_STRINGS = {
         "choose_mode": "Select Mode:",
         "control_panel": "Control Panel",
         "face_list": "Face List",
+        "all_categories": "All Categories",
+        "search_faces": "Search faces (number or label)",
         "ready": "Ready",
-        "drop_file": "Drop STEP file here"
+        "drop_file": "Drop STEP file here",
+        "cancel_display": "Cancel Display"
     },
     "zh": {
         "title": "3D CAD 智能分割系统",
@@ -238,7 +286,10 @@ LANGUAGE_STRINGS = {
         "choose_mode": "选择模式:",
         "control_panel": "控制面板",
         "face_list": "面列表",
+        "all_categories": "全部类别",
+        "search_faces": "搜索面(编号或类别)",
         "ready": "准备就绪",
-        "drop_file": "拖拽STEP文件到此处"
+        "drop_file": "拖拽STEP文件到此处",
+        "cancel_display": "取消显示"
     }
 }
\ No newline at end of file
@@ -0,0 +1,96 @@
+# face_list_model.py
+import numpy as np
+from PyQt5.QtCore import Qt, QAbstractListModel, QModelIndex
+from PyQt5.QtGui import QColor
+
+# 列表项对应的面索引
+FACE_INDEX_ROLE = Qt.UserRole
+UNKNOWN_LABEL_COLOR = QColor(150, 150, 150)
+
+
+class FaceListModel(QAbstractListModel):
+    """面列表模型，按需从标签数组生成显示文本和颜色"""
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.labels = np.zeros(0, dtype=np.int64)
+        self.label_names = []
+        self.label_colors = []
+        self.label_version = None
+        self.category_filter = None
+        self.search_text = ""
+        # 过滤后可见的面索引(升序)
+        self.rows = np.zeros(0, dtype=np.int64)
+
+    def set_labels(self, labels, names, colors, version=None):
+        """设置标签数组和类别信息，不复制标签数据"""
+        self.beginResetModel()
+        self.labels = labels if isinstance(labels, np.ndarray) else np.asarray(labels, dtype=np.int64)
+        self.label_version = version
+        self.label_names = list(names)
+        self.label_colors = [QColor(*color) for color in colors]
+        self.rows = self._filtered_rows()
+        self.endResetModel()
+
+    def clear(self):
+        self.set_labels(np.zeros(0, dtype=np.int64), [], [])
+
+    def set_filter(self, category=None, text=""):
+        """按类别和搜索文本过滤面列表"""
+        self.beginResetModel()
+        self.category_filter = category
+        self.search_text = text.strip()
+        self.rows = self._filtered_rows()
+        self.endResetModel()
+
+    def _filtered_rows(self):
+        mask = np.ones(len(self.labels), dtype=bool)
+        if self.category_filter is not None:
+            mask &= self.labels == self.category_filter
+
+        text = self.search_text.lower()
+        if text.startswith("面"):
+            text = text[1:].strip()
+        if text:
+            # 类别名称匹配的标签
+            name_hits = [i for i, name in enumerate(self.label_names) if text in name.lower()]
+            text_mask = np.isin(self.labels, name_hits)
+            if text.isdigit():
+                numbers = np.char.mod("%d", np.arange(1, len(self.labels) + 1))
+                text_mask |= np.char.find(numbers, text) >= 0
+            mask &= text_mask
+
+        return np.flatnonzero(mask)
+
+    def row_of_face(self, face_index):
+        """返回面索引在当前列表中的行号，不可见时返回-1"""
+        row = int(np.searchsorted(self.rows, face_index))
+        if row < len(self.rows) and self.rows[row] == face_index:
+            return row
+        return -1
+
+    def rowCount(self, parent=QModelIndex()):
+        if parent.isValid():
+            return 0
+        return len(self.rows)
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid() or index.row() >= len(self.rows):
+            return None
+
+        face_index = int(self.rows[index.row()])
+        if role == FACE_INDEX_ROLE:
+            return face_index
+
+        label_num = int(self.labels[face_index])
+        if role == Qt.DisplayRole:
+            if label_num < len(self.label_names):
+                label_name = self.label_names[label_num]
+            else:
+                label_name = f"未知标签 {label_num}"
+            return f"面 {face_index + 1}: {label_name}"
+        if role == Qt.ForegroundRole:
+            if label_num < len(self.label_colors):
+                return self.label_colors[label_num]
+            return UNKNOWN_LABEL_COLOR
+        return None
@@ -0,0 +1,458 @@
+# face_sampling.py
+import argparse
+import hashlib
+from collections import defaultdict
+import numpy as np
+from OCC.Core.BRepAdaptor import BRepAdaptor_Surface, BRepAdaptor_Curve, BRepAdaptor_Curve2d
+from OCC.Core.BRepTools import breptools_UVBounds
+from OCC.Core.BRepTopAdaptor import BRepTopAdaptor_FClass2d
+from OCC.Core.BRep import BRep_Tool
+from OCC.Core.GeomAbs import (
+    GeomAbs_Plane, GeomAbs_Cylinder, GeomAbs_Cone, GeomAbs_Sphere, GeomAbs_Torus,
+    GeomAbs_BSplineSurface, GeomAbs_BezierSurface, GeomAbs_Line, GeomAbs_Circle, GeomAbs_Ellipse,
+    GeomAbs_BSplineCurve, GeomAbs_BezierCurve
+)
+from OCC.Core.TopAbs import TopAbs_REVERSED, TopAbs_FACE, TopAbs_EDGE, TopAbs_IN, TopAbs_ON
+from OCC.Core.TopExp import TopExp_Explorer
+from OCC.Core.TopoDS import TopoDS_Face, TopoDS_Edge
+from OCC.Core.gp import gp_Pnt2d
+
+SURFACE_TYPE_NAMES = {GeomAbs_Plane: "plane", GeomAbs_Cylinder: "cylinder",
+                      GeomAbs_Cone: "cone", GeomAbs_Sphere: "sphere"}
+CURVE_TYPE_NAMES = {GeomAbs_Line: "line", GeomAbs_Circle: "circle"}
+# 法向长度低于该值时视为未定义(如圆锥顶点、球面极点)，与GeomLProp一致返回零向量
+NORMAL_EPSILON = 1e-9
+# 与occwl的visibility_status相同的二维分类容差
+CLASSIFIER_TOLERANCE = 1e-9
+# 曲线参数曲线离散成折线的段数(直线参数曲线只取端点)
+PCURVE_SEGMENTS = 16
+# 相对于UV范围的容差，用于判断边界是否落在UV包围盒上以及折线近似误差的余量
+UV_RELATIVE_TOLERANCE = 1e-7
+# 几何哈希前数值保留的小数位数，消除重新导出STEP时的末位误差
+HASH_DECIMALS = 9
+
+
+def _xyz(v):
+    return np.array([v.X(), v.Y(), v.Z()])
+
+
+def _axes(ax):
+    """gp_Ax3/gp_Ax2的原点和三个方向"""
+    return _xyz(ax.Location()), _xyz(ax.XDirection()), _xyz(ax.YDirection()), _xyz(ax.Direction())
+
+
+def _outer(s, d):
+    """标量网格(...)与方向(3,)的外积，得到(..., 3)"""
+    return s[..., None] * d
+
+
+def _unit_normals(d1u, d1v):
+    normals = np.cross(d1u, d1v)
+    length = np.linalg.norm(normals, axis=-1, keepdims=True)
+    return np.where(length > NORMAL_EPSILON, normals / np.maximum(length, NORMAL_EPSILON), 0.0)
+
+
+def uv_parameters(topods_face, num_u, num_v):
+    """与occwl的uvgrid相同的均匀UV采样参数，返回(num_u, num_v)的U、V"""
+    umin, umax, vmin, vmax = breptools_UVBounds(topods_face)
+    return np.meshgrid(np.linspace(umin, umax, num_u), np.linspace(vmin, vmax, num_v), indexing="ij")
+
+
+def _plane(surface, u, v):
+    p, x, y, _ = _axes(surface.Plane().Position())
+    points = p + _outer(u, x) + _outer(v, y)
+    d1u = np.broadcast_to(x, points.shape)
+    d1v = np.broadcast_to(y, points.shape)
+    return points, d1u, d1v
+
+
+def _cylinder(surface, u, v):
+    cylinder = surface.Cylinder()
+    p, x, y, z = _axes(cylinder.Position())
+    r = cylinder.Radius()
+    radial = _outer(np.cos(u), x) + _outer(np.sin(u), y)
+    points = p + r * radial + _outer(v, z)
+    d1u = r * (_outer(-np.sin(u), x) + _outer(np.cos(u), y))
+    d1v = np.broadcast_to(z, points.shape)
+    return points, d1u, d1v
+
+
+def _cone(surface, u, v):
+    cone = surface.Cone()
+    p, x, y, z = _axes(cone.Position())
+    r, angle = cone.RefRadius(), cone.SemiAngle()
+    radial = _outer(np.cos(u), x) + _outer(np.sin(u), y)
+    radius = r + v * np.sin(angle)
+    points = p + radius[..., None] * radial + _outer(v * np.cos(angle), z)
+    d1u = radius[..., None] * (_outer(-np.sin(u), x) + _outer(np.cos(u), y))
+    d1v = np.sin(angle) * radial + np.cos(angle) * z
+    return points, d1u, d1v
+
+
+def _sphere(surface, u, v):
+    sphere = surface.Sphere()
+    p, x, y, z = _axes(sphere.Position())
+    r = sphere.Radius()
+    radial = _outer(np.cos(u), x) + _outer(np.sin(u), y)
+    points = p + r * np.cos(v)[..., None] * radial + _outer(r * np.sin(v), z)
+    d1u = r * np.cos(v)[..., None] * (_outer(-np.sin(u), x) + _outer(np.cos(u), y))
+    d1v = r * (-np.sin(v)[..., None] * radial + _outer(np.cos(v), z))
+    return points, d1u, d1v
+
+
+SURFACE_SAMPLERS = {GeomAbs_Plane: _plane, GeomAbs_Cylinder: _cylinder,
+                    GeomAbs_Cone: _cone, GeomAbs_Sphere: _sphere}
+
+
+def analytic_face_grid(topods_face, num_u, num_v):
+    """解析曲面的点和法向网格(num_u, num_v, 3)，其他曲面返回None
+
+    采样参数、法向方向和反向面的行顺序与occwl的uvgrid一致。
+    """
+    surface = BRepAdaptor_Surface(topods_face, True)
+    sampler = SURFACE_SAMPLERS.get(surface.GetType())
+    if sampler is None:
+        return None
+
+    u, v = uv_parameters(topods_face, num_u, num_v)
+    points, d1u, d1v = sampler(surface, u, v)
+    normals = _unit_normals(d1u, d1v)
+    if topods_face.Orientation() == TopAbs_REVERSED:
+        normals = -normals
+        points, normals = points[::-1], normals[::-1]
+    return points, normals
+
+
+def analytic_edge_grid(topods_edge, num_u):
+    """直线和圆弧边的点和单位切向(num_u, 3)，其他曲线返回None"""
+    if BRep_Tool.Degenerated(topods_edge):
+        return None
+    curve = BRepAdaptor_Curve(topods_edge)
+    curve_type = curve.GetType()
+    t = np.linspace(curve.FirstParameter(), curve.LastParameter(), num_u)
+
+    if curve_type == GeomAbs_Line:
+        line = curve.Line()
+        p, d = _xyz(line.Location()), _xyz(line.Direction())
+        points = p + _outer(t, d)
+        tangents = np.broadcast_to(d, points.shape).copy()
+    elif curve_type == GeomAbs_Circle:
+        circle = curve.Circle()
+        p, x, y, _ = _axes(circle.Position())
+        r = circle.Radius()
+        points = p + r * (_outer(np.cos(t), x) + _outer(np.sin(t), y))
+        tangents = _outer(-np.sin(t), x) + _outer(np.cos(t), y)
+    else:
+        return None
+
+    if topods_edge.Orientation() == TopAbs_REVERSED:
+        tangents = -tangents
+        points, tangents = points[::-1], tangents[::-1]
+    return points, tangents
+
+
+def _boundary_segments(topods_face):
+    """面边界的参数曲线离散成的UV线段(起点、终点)，以及折线相对曲线的最大偏差"""
+    starts, ends = [], []
+    deviation = 0.0
+    explorer = TopExp_Explorer(topods_face, TopAbs_EDGE)
+    while explorer.More():
+        edge = explorer.Current()
+        if not isinstance(edge, TopoDS_Edge):
+            edge = TopoDS_Edge(edge)
+        curve = BRepAdaptor_Curve2d(edge, topods_face)
+        segments = 1 if curve.GetType() == GeomAbs_Line else PCURVE_SEGMENTS
+        # 同时计算线段中点处的曲线值，用于估计折线误差
+        t = np.linspace(curve.FirstParameter(), curve.LastParameter(), 2 * segments + 1)
+        values = np.array([[p.X(), p.Y()] for p in map(curve.Value, t)])
+        nodes, middles = values[::2], values[1::2]
+        deviation = max(deviation, float(np.linalg.norm(middles - (nodes[:-1] + nodes[1:]) / 2, axis=1).max()))
+        starts.append(nodes[:-1])
+        ends.append(nodes[1:])
+        explorer.Next()
+    if not starts:
+        return np.empty((0, 2)), np.empty((0, 2)), deviation
+    return np.concatenate(starts), np.concatenate(ends), deviation
+
+
+def _is_untrimmed(starts, ends, bounds, tolerance):
+    """边界的每条线段都落在UV包围盒的某条边上，即面的参数域没有被裁剪"""
+    umin, umax, vmin, vmax = bounds
+    on_side = np.zeros(len(starts), dtype=bool)
+    for axis, value in ((0, umin), (0, umax), (1, vmin), (1, vmax)):
+        on_side |= (np.abs(starts[:, axis] - value) <= tolerance) & (np.abs(ends[:, axis] - value) <= tolerance)
+    return bool(on_side.all())
+
+
+def _polygon_contains(points, starts, ends):
+    """奇偶规则判断点是否在折线边界内，点(N, 2)对线段(S, 2)一次计算"""
+    px, py = points[:, 0:1], points[:, 1:2]
+    ax, ay, bx, by = starts[:, 0], starts[:, 1], ends[:, 0], ends[:, 1]
+    straddles = (ay > py) != (by > py)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        x_cross = ax + (py - ay) * (bx - ax) / (by - ay)
+    crossings = np.count_nonzero(straddles & (px < x_cross), axis=1)
+    return crossings % 2 == 1
+
+
+def _segment_distances(points, starts, ends):
+    """点到最近线段的距离"""
+    d = ends - starts
+    length2 = np.maximum((d ** 2).sum(axis=1), 1e-300)
+    t = np.clip(((points[:, None, :] - starts) * d).sum(axis=2) / length2, 0.0, 1.0)
+    nearest = starts + t[..., None] * d
+    return np.linalg.norm(points[:, None, :] - nearest, axis=2).min(axis=1)
+
+
+def trimming_mask(topods_face, num_u, num_v):
+    """UV采样点是否在面内(包括边界上)，与uvgrid(method="visibility_status")的掩码一致
+
+    未裁剪的面直接返回全部为真；其余的面先用边界折线对所有采样点做向量化判断，
+    只有靠近边界的点再交给该面唯一的BRepTopAdaptor_FClass2d精确分类。
+    """
+    bounds = breptools_UVBounds(topods_face)
+    tolerance = UV_RELATIVE_TOLERANCE * max(bounds[1] - bounds[0], bounds[3] - bounds[2], 1.0)
+    starts, ends, deviation = _boundary_segments(topods_face)
+
+    if len(starts) and _is_untrimmed(starts, ends, bounds, tolerance):
+        mask = np.ones((num_u, num_v), dtype=bool)
+    else:
+        u, v = uv_parameters(topods_face, num_u, num_v)
+        points = np.stack([u.ravel(), v.ravel()], axis=1)
+        if len(starts):
+            inside = _polygon_contains(points, starts, ends)
+            uncertain = _segment_distances(points, starts, ends) <= 2 * deviation + tolerance
+        else:
+            inside = np.zeros(len(points), dtype=bool)
+            uncertain = np.ones(len(points), dtype=bool)
+
+        if uncertain.any():
+            classifier = BRepTopAdaptor_FClass2d(topods_face, CLASSIFIER_TOLERANCE)
+            for i in np.flatnonzero(uncertain):
+                state = classifier.Perform(gp_Pnt2d(points[i, 0], points[i, 1]))
+                inside[i] = state in (TopAbs_IN, TopAbs_ON)
+        mask = inside.reshape(num_u, num_v)
+
+    if topods_face.Orientation() == TopAbs_REVERSED:
+        mask = mask[::-1]
+    return mask
+
+
+def _xy(p):
+    return [p.X(), p.Y()]
+
+
+def _axes2d(ax):
+    """gp_Ax22d的原点和两个方向"""
+    return _xy(ax.Location()) + _xy(ax.XDirection()) + _xy(ax.YDirection())
+
+
+def _knots(spline, count, knot, multiplicity):
+    """节点值和重数，count/knot/multiplicity为B样条对应方向的方法名"""
+    n = getattr(spline, count)()
+    return ([getattr(spline, knot)(i) for i in range(1, n + 1)]
+            + [getattr(spline, multiplicity)(i) for i in range(1, n + 1)])
+
+
+def _surface_parameters(surface, surface_type):
+    """曲面的完整定义参数，无法完整描述的曲面类型(旋转、拉伸、偏置等)返回None
+
+    解析曲面为坐标系和尺寸；B样条和Bezier曲面为次数、节点和重数、控制点和权重。
+    """
+    if surface_type == GeomAbs_Plane:
+        return np.concatenate(_axes(surface.Plane().Position()))
+    if surface_type == GeomAbs_Cylinder:
+        cylinder = surface.Cylinder()
+        return np.concatenate(_axes(cylinder.Position()) + ([cylinder.Radius()],))
+    if surface_type == GeomAbs_Cone:
+        cone = surface.Cone()
+        return np.concatenate(_axes(cone.Position()) + ([cone.RefRadius(), cone.SemiAngle()],))
+    if surface_type == GeomAbs_Sphere:
+        sphere = surface.Sphere()
+        return np.concatenate(_axes(sphere.Position()) + ([sphere.Radius()],))
+    if surface_type == GeomAbs_Torus:
+        torus = surface.Torus()
+        return np.concatenate(_axes(torus.Position()) + ([torus.MajorRadius(), torus.MinorRadius()],))
+    if surface_type == GeomAbs_BSplineSurface:
+        spline = surface.BSpline()
+        values = [spline.UDegree(), spline.VDegree(), spline.IsUPeriodic(), spline.IsVPeriodic(),
+                  spline.NbUPoles(), spline.NbVPoles()]
+        values += _knots(spline, "NbUKnots", "UKnot", "UMultiplicity")
+        values += _knots(spline, "NbVKnots", "VKnot", "VMultiplicity")
+    elif surface_type == GeomAbs_BezierSurface:
+        spline = surface.Bezier()
+        values = [spline.UDegree(), spline.VDegree(), spline.NbUPoles(), spline.NbVPoles()]
+    else:
+        return None
+    # 非有理曲面的权重都为1
+    for i in range(1, spline.NbUPoles() + 1):
+        for j in range(1, spline.NbVPoles() + 1):
+            values.extend(_xyz(spline.Pole(i, j)))
+            values.append(spline.Weight(i, j))
+    return np.array(values, dtype=np.float64)
+
+
+def _pcurve_parameters(curve):
+    """边在面参数空间中的曲线(BRepAdaptor_Curve2d)的完整定义，无法完整描述的曲线类型返回None"""
+    curve_type = curve.GetType()
+    values = [curve_type, curve.FirstParameter(), curve.LastParameter()]
+    if curve_type == GeomAbs_Line:
+        line = curve.Line()
+        values += _xy(line.Location()) + _xy(line.Direction())
+    elif curve_type == GeomAbs_Circle:
+        circle = curve.Circle()
+        values += _axes2d(circle.Position()) + [circle.Radius()]
+    elif curve_type == GeomAbs_Ellipse:
+        ellipse = curve.Ellipse()
+        values += _axes2d(ellipse.Axis()) + [ellipse.MajorRadius(), ellipse.MinorRadius()]
+    elif curve_type in (GeomAbs_BSplineCurve, GeomAbs_BezierCurve):
+        spline = curve.BSpline() if curve_type == GeomAbs_BSplineCurve else curve.Bezier()
+        values += [spline.Degree(), spline.IsPeriodic(), spline.NbPoles()]
+        if curve_type == GeomAbs_BSplineCurve:
+            values += _knots(spline, "NbKnots", "Knot", "Multiplicity")
+        for i in range(1, spline.NbPoles() + 1):
+            values += _xy(spline.Pole(i)) + [spline.Weight(i)]
+    else:
+        return None
+    return np.array(values, dtype=np.float64)
+
+
+def face_geometry_hash(topods_face, num_u, num_v):
+    """面几何的哈希：曲面的完整定义、裁剪边界(各边参数曲线的完整定义)、方向和采样数
+
+    哈希相同的面采样得到的特征相同，修改后的零件只需重新采样哈希变化的面。
+    曲面或边界曲线无法完整描述时返回None，这样的面不使用缓存。
+    """
+    surface = BRepAdaptor_Surface(topods_face, True)
+    surface_type = surface.GetType()
+    parameters = _surface_parameters(surface, surface_type)
+    if parameters is None:
+        return None
+    values = [np.array([surface_type, num_u, num_v, topods_face.Orientation() == TopAbs_REVERSED]),
+              np.asarray(breptools_UVBounds(topods_face)), parameters]
+
+    explorer = TopExp_Explorer(topods_face, TopAbs_EDGE)
+    while explorer.More():
+        edge = explorer.Current()
+        if not isinstance(edge, TopoDS_Edge):
+            edge = TopoDS_Edge(edge)
+        parameters = _pcurve_parameters(BRepAdaptor_Curve2d(edge, topods_face))
+        if parameters is None:
+            return None
+        values.append(np.array([edge.Orientation()]))
+        values.append(parameters)
+        explorer.Next()
+
+    # 加0.0把-0.0变成0.0，避免相同的值得到不同的字节
+    data = np.round(np.concatenate(values).astype(np.float64), HASH_DECIMALS) + 0.0
+    return hashlib.blake2b(data.tobytes(), digest_size=16).hexdigest()
+
+
+def sample_face(topods_face, num_u, num_v):
+    """面的点和法向网格，解析曲面走快速路径，其余(如B样条)使用occwl的uvgrid"""
+    grid = analytic_face_grid(topods_face, num_u, num_v)
+    if grid is not None:
+        return grid
+    from occwl.face import Face
+    from occwl.uvgrid import uvgrid
+    face = Face(topods_face)
+    return (uvgrid(face, method="point", num_u=num_u, num_v=num_v),
+            uvgrid(face, method="normal", num_u=num_u, num_v=num_v))
+
+
+def sample_edge(topods_edge, num_u):
+    """边的点和切向，直线和圆弧走快速路径，没有三维曲线的边返回None"""
+    grid = analytic_edge_grid(topods_edge, num_u)
+    if grid is not None:
+        return grid
+    from occwl.edge import Edge
+    from occwl.uvgrid import ugrid
+    edge = Edge(topods_edge)
+    if not edge.has_curve():
+        return None
+    return (ugrid(edge, method="point", num_u=num_u),
+            ugrid(edge, method="tangent", num_u=num_u))
+
+
+def _subshapes(shape, shape_type, cast):
+    explorer = TopExp_Explorer(shape, shape_type)
+    while explorer.More():
+        subshape = explorer.Current()
+        yield subshape if isinstance(subshape, cast) else cast(subshape)
+        explorer.Next()
+
+
+def shape_parity(shape, num_u=10, num_v=10):
+    """按曲面/曲线类型比较快速路径与uvgrid/ugrid的最大偏差，以及裁剪掩码的差异
+
+    返回{类型: [数量, 点偏差, 法向/切向偏差]}，"mask"的点偏差为掩码不一致的采样点比例。
+    """
+    from occwl.face import Face
+    from occwl.edge import Edge
+    from occwl.uvgrid import uvgrid, ugrid
+
+    deviations = defaultdict(lambda: [0, 0.0, 0.0])
+    for topods_face in _subshapes(shape, TopAbs_FACE, TopoDS_Face):
+        face = Face(topods_face)
+        # 裁剪掩码对所有类型的面检查
+        status = uvgrid(face, method="visibility_status", num_u=num_u, num_v=num_v)[..., 0]
+        expected = np.logical_or(status == 0, status == 2)
+        entry = deviations["mask"]
+        entry[0] += 1
+        entry[1] = max(entry[1], float(np.mean(trimming_mask(topods_face, num_u, num_v) != expected)))
+
+        grid = analytic_face_grid(topods_face, num_u, num_v)
+        if grid is None:
+            continue
+        name = SURFACE_TYPE_NAMES[BRepAdaptor_Surface(topods_face, True).GetType()]
+        points = uvgrid(face, method="point", num_u=num_u, num_v=num_v)
+        normals = uvgrid(face, method="normal", num_u=num_u, num_v=num_v)
+        entry = deviations[name]
+        entry[0] += 1
+        entry[1] = max(entry[1], float(np.abs(grid[0] - points).max()))
+        entry[2] = max(entry[2], float(np.abs(grid[1] - normals).max()))
+
+    for topods_edge in _subshapes(shape, TopAbs_EDGE, TopoDS_Edge):
+        edge = Edge(topods_edge)
+        if not edge.has_curve():
+            continue
+        grid = analytic_edge_grid(topods_edge, num_u)
+        if grid is None:
+            continue
+        name = CURVE_TYPE_NAMES[BRepAdaptor_Curve(topods_edge).GetType()]
+        points = ugrid(edge, method="point", num_u=num_u)
+        tangents = ugrid(edge, method="tangent", num_u=num_u)
+        entry = deviations[name]
+        entry[0] += 1
+        entry[1] = max(entry[1], float(np.abs(grid[0] - points).max()))
+        entry[2] = max(entry[2], float(np.abs(grid[1] - tangents).max()))
+    return dict(deviations)
+
+
+def check_parity(step_file, num_u=10, num_v=10):
+    """STEP文件中所有面和边的shape_parity"""
+    from OCC.Extend.DataExchange import read_step_file
+    shape = read_step_file(step_file)
+    if not shape:
+        raise ValueError("无法读取STEP文件")
+    return shape_parity(shape, num_u, num_v)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="检查解析采样和裁剪掩码与occwl通用采样的一致性")
+    parser.add_argument("step_files", nargs="+", help="STEP文件")
+    parser.add_argument("--tolerance", type=float, default=1e-6, help="允许的最大偏差")
+    args = parser.parse_args()
+
+    failed = False
+    for step_file in args.step_files:
+        for name, (count, point_error, direction_error) in sorted(check_parity(step_file).items()):
+            ok = point_error <= args.tolerance and direction_error <= args.tolerance
+            failed |= not ok
+            print(f"{step_file} {name}: {count} 个, 点偏差 {point_error:.2e}, "
+                  f"方向偏差 {direction_error:.2e} {'OK' if ok else 'FAIL'}")
+    raise SystemExit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
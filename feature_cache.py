@@ -0,0 +1,122 @@
+# feature_cache.py
+import sqlite3
+import numpy as np
+from constants import FEATURE_CACHE_PATH, FEATURE_CACHE_MAX_FACES, FEATURE_CACHE_BUSY_TIMEOUT
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS face_features (
+    key TEXT PRIMARY KEY,
+    dtype TEXT NOT NULL,
+    shape TEXT NOT NULL,
+    data BLOB NOT NULL,
+    used INTEGER NOT NULL
+)
+"""
+INDEXES = (
+    "CREATE INDEX IF NOT EXISTS face_features_used ON face_features (used)",
+)
+# SQLite单条语句的参数数量有限，按批查询
+QUERY_BATCH = 500
+# 超出保留数量的比例，写入这么多新面后才检查是否需要删除旧面
+PRUNE_MARGIN = 0.1
+
+
+class FaceFeatureCache:
+    """按面几何哈希保存的采样特征(SQLite)，统计命中和未命中的面数
+
+    每写入一定数量(保留数量的PRUNE_MARGIN)的新面检查一次总数，超出保留数量时删除最久未使用的面。
+    数据库错误(sqlite3.Error)由调用方处理，缓存不可用时应直接采样。
+    """
+
+    def __init__(self, db_path=FEATURE_CACHE_PATH, max_faces=FEATURE_CACHE_MAX_FACES,
+                 timeout=FEATURE_CACHE_BUSY_TIMEOUT):
+        self.db_path = db_path
+        self.max_faces = max_faces
+        self.connection = sqlite3.connect(db_path, timeout=timeout)
+        self.connection.execute(SCHEMA)
+        for index in INDEXES:
+            self.connection.execute(index)
+        self.connection.commit()
+        # 使用顺序，命中和写入时递增
+        self.clock = self.connection.execute("SELECT COALESCE(MAX(used), 0) FROM face_features").fetchone()[0]
+        self.hits = 0
+        self.misses = 0
+        # 上次检查总数之后写入的面数
+        self.written = 0
+
+    def get_many(self, keys):
+        """查询一组面，返回{key: 特征数组}，并累计命中统计"""
+        unique_keys = list(dict.fromkeys(keys))
+        found = {}
+        for start in range(0, len(unique_keys), QUERY_BATCH):
+            batch = unique_keys[start:start + QUERY_BATCH]
+            rows = self.connection.execute(
+                f"SELECT key, dtype, shape, data FROM face_features WHERE key IN ({', '.join('?' * len(batch))})",
+                batch
+            ).fetchall()
+            for key, dtype, shape, data in rows:
+                shape = tuple(int(n) for n in shape.split(","))
+                found[key] = np.frombuffer(data, dtype=np.dtype(dtype)).reshape(shape)
+
+        hits = sum(1 for key in keys if key in found)
+        self.hits += hits
+        self.misses += len(keys) - hits
+        if found:
+            self.clock += 1
+            with self.connection:
+                for start in range(0, len(found), QUERY_BATCH):
+                    batch = list(found)[start:start + QUERY_BATCH]
+                    self.connection.execute(
+                        f"UPDATE face_features SET used = ? WHERE key IN ({', '.join('?' * len(batch))})",
+                        [self.clock] + batch
+                    )
+        return found
+
+    def put_many(self, features):
+        """保存{key: 特征数组}"""
+        if not features:
+            return
+        self.clock += 1
+        rows = []
+        for key, x in features.items():
+            x = np.ascontiguousarray(x)
+            rows.append((key, x.dtype.str, ",".join(str(n) for n in x.shape),
+                         sqlite3.Binary(x.tobytes()), self.clock))
+        with self.connection:
+            self.connection.executemany(
+                "INSERT OR REPLACE INTO face_features (key, dtype, shape, data, used) VALUES (?, ?, ?, ?, ?)", rows
+            )
+            self.written += len(rows)
+            if self.max_faces and self.max_faces > 0 and self.written >= max(1, self.max_faces * PRUNE_MARGIN):
+                self.written = 0
+                self._prune()
+
+    def _prune(self):
+        """删除超出max_faces的最久未使用的面(按used索引只读取要删除的行)"""
+        excess = self.count() - self.max_faces
+        if excess > 0:
+            self.connection.execute(
+                "DELETE FROM face_features WHERE rowid IN"
+                " (SELECT rowid FROM face_features ORDER BY used LIMIT ?)",
+                (excess,)
+            )
+
+    def reset_stats(self):
+        self.hits = 0
+        self.misses = 0
+
+    def stats(self):
+        """命中统计: 命中面数、未命中面数和命中率"""
+        total = self.hits + self.misses
+        return {"hits": self.hits, "misses": self.misses, "hit_rate": self.hits / total if total else 0.0}
+
+    def count(self):
+        return self.connection.execute("SELECT COUNT(*) FROM face_features").fetchone()[0]
+
+    def clear(self):
+        with self.connection:
+            self.connection.execute("DELETE FROM face_features")
+        self.reset_stats()
+
+    def close(self):
+        self.connection.close()
@@ -0,0 +1,263 @@
+# graph_builder.py
+import os
+import json
+import time
+import argparse
+import multiprocessing
+from multiprocessing.connection import wait
+from graph_dataset import GraphShardWriter, graph_to_arrays, DEFAULT_SHARD_SIZE, FEATURE_DTYPES
+from batch_scheduler import estimate_face_counts, longest_first
+
+MANIFEST_NAME = "manifest.jsonl"
+DEFAULT_TIMEOUT = 300
+
+
+def build_part(step_file, options):
+    """读取STEP文件并构建归一化的图，在工作进程中运行
+
+    图包含整个形状的所有面(装配中的每个实体以及实体外的面)，节点顺序与显示的面顺序一致，
+    模式2的标签因此与模式1一样对应显示的每个面。
+    """
+    from OCC.Extend.DataExchange import read_step_file
+    from OCC.Core.TopAbs import TopAbs_FACE
+    from OCC.Core.TopExp import TopExp_Explorer
+    from graph_utils import build_graph
+    from preprocessor import normalize_graph
+
+    shape = read_step_file(step_file)
+    if not shape:
+        raise ValueError("无法读取STEP文件")
+    graph = normalize_graph(build_graph(shape, options["curv_samples"],
+                                        options["surf_samples"], options["surf_samples"]))
+
+    # 图的节点是去重后的面，同一个面在形状中出现多次时无法与显示的面一一对应
+    face_count = 0
+    explorer = TopExp_Explorer(shape, TopAbs_FACE)
+    while explorer.More():
+        face_count += 1
+        explorer.Next()
+    if face_count != graph.num_nodes():
+        raise ValueError(f"形状中有重复的面，图的{graph.num_nodes()}个节点与显示的{face_count}个面无法对应")
+    return graph
+
+
+def worker_main(conn, options):
+    """工作进程：从管道接收(零件id, STEP文件)，返回构建结果"""
+    import torch
+    from dgl.data.utils import save_graphs
+
+    while True:
+        task = conn.recv()
+        if task is None:
+            break
+        part_id, step_file = task
+        start = time.perf_counter()
+        try:
+            graph = build_part(step_file, options)
+            result = {"faces": graph.num_nodes(), "edges": graph.num_edges()}
+            if options["shards"]:
+                arrays = graph_to_arrays(graph)
+                result["arrays"] = (arrays[0].astype(options["dtype"]), arrays[1].astype(options["dtype"]),
+                                    arrays[2], arrays[3])
+            else:
+                graph.ndata["x"] = graph.ndata["x"].to(getattr(torch, options["dtype"]))
+                graph.edata["x"] = graph.edata["x"].to(getattr(torch, options["dtype"]))
+                save_graphs(os.path.join(options["output_dir"], f"{part_id}.bin"), [graph])
+            conn.send((part_id, "ok", result, time.perf_counter() - start))
+        except Exception as e:
+            conn.send((part_id, "failed", {"error": str(e)}, time.perf_counter() - start))
+
+
+class Worker:
+    """一个工作进程及其当前任务，超时时可以单独终止并重启"""
+
+    def __init__(self, options):
+        self.options = options
+        self.task = None
+        self.started = None
+        self.start()
+
+    def start(self):
+        self.conn, child_conn = multiprocessing.Pipe()
+        self.process = multiprocessing.Process(target=worker_main, args=(child_conn, self.options), daemon=True)
+        self.process.start()
+        child_conn.close()
+
+    def submit(self, task):
+        self.task = task
+        self.started = time.perf_counter()
+        self.conn.send(task)
+
+    def restart(self):
+        self.process.terminate()
+        self.process.join()
+        self.conn.close()
+        self.task = None
+        self.start()
+
+    def stop(self):
+        try:
+            self.conn.send(None)
+        except (OSError, BrokenPipeError):
+            pass
+        self.process.join(timeout=5)
+        if self.process.is_alive():
+            self.process.terminate()
+        self.conn.close()
+
+
+def read_manifest(manifest_path):
+    """读取清单，同一零件以最后一条记录为准，忽略跳过的重复文件"""
+    entries = {}
+    if os.path.exists(manifest_path):
+        with open(manifest_path, 'r', encoding='utf-8') as f:
+            for line in f:
+                line = line.strip()
+                if line:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        # 中断时可能留下不完整的最后一行
+                        continue
+                    if entry["status"] != "skipped":
+                        entries[entry["part_id"]] = entry
+    return entries
+
+
+def find_step_files(input_dir):
+    step_files = []
+    for root, _, files in os.walk(input_dir):
+        for file in sorted(files):
+            if file.lower().endswith(('.step', '.stp')):
+                step_files.append(os.path.join(root, file))
+    return sorted(step_files)
+
+
+def build_dataset(input_dir, output_dir, workers=None, timeout=DEFAULT_TIMEOUT, shards=False,
+                  shard_size=DEFAULT_SHARD_SIZE, dtype="float32", curv_samples=10, surf_samples=10, retry_failed=False):
+    """并行把文件夹中的STEP文件转换为图，已完成的零件在重新运行时跳过"""
+    os.makedirs(output_dir, exist_ok=True)
+    manifest_path = os.path.join(output_dir, MANIFEST_NAME)
+    entries = read_manifest(manifest_path)
+
+    writer = GraphShardWriter(output_dir, shard_size, dtype) if shards else None
+
+    def is_done(part_id):
+        entry = entries.get(part_id)
+        if entry is None:
+            return False
+        if entry["status"] != "ok":
+            return not retry_failed
+        # 清单中成功的零件还要确认输出确实存在(分片可能尚未写入)
+        if shards:
+            return part_id in writer.index["parts"]
+        return os.path.exists(os.path.join(output_dir, f"{part_id}.bin"))
+
+    tasks = []
+    seen = set()
+    manifest = open(manifest_path, 'a', encoding='utf-8')
+
+    def record(entry):
+        if entry["status"] != "skipped":
+            entries[entry["part_id"]] = entry
+        manifest.write(json.dumps(entry, ensure_ascii=False) + "\n")
+        manifest.flush()
+
+    for step_file in find_step_files(input_dir):
+        part_id = os.path.splitext(os.path.basename(step_file))[0]
+        if part_id in seen:
+            # 模式2按STEP文件名查找零件，同名文件只处理第一个
+            record({"part_id": part_id, "step_file": step_file, "status": "skipped",
+                    "error": "零件id重复"})
+            continue
+        seen.add(part_id)
+        if not is_done(part_id):
+            tasks.append((part_id, step_file))
+
+    # 最大的零件最先开始，避免它在最后单独占用一个工作进程
+    tasks = longest_first(tasks, estimate_face_counts([step_file for _, step_file in tasks]))
+
+    options = {"output_dir": output_dir, "shards": shards, "dtype": dtype,
+               "curv_samples": curv_samples, "surf_samples": surf_samples}
+    pool = [Worker(options) for _ in range(min(workers or os.cpu_count() or 1, len(tasks)))]
+    pending = list(reversed(tasks))
+    finished = 0
+
+    try:
+        while pending or any(w.task for w in pool):
+            for worker in pool:
+                if worker.task is None and pending:
+                    worker.submit(pending.pop())
+
+            busy = [w for w in pool if w.task]
+            ready = wait([w.conn for w in busy], timeout=1.0)
+            for worker in busy:
+                if worker.conn in ready:
+                    try:
+                        part_id, status, result, seconds = worker.conn.recv()
+                        step_file = worker.task[1]
+                        worker.task = None
+                    except EOFError:
+                        # 工作进程崩溃(例如OCC内部错误)
+                        part_id, step_file = worker.task
+                        status, result = "failed", {"error": "工作进程异常退出"}
+                        seconds = time.perf_counter() - worker.started
+                        worker.restart()
+
+                    entry = {"part_id": part_id, "step_file": step_file, "status": status,
+                             "seconds": round(seconds, 3)}
+                    if status == "ok" and shards:
+                        try:
+                            writer.add_arrays(part_id, *result.pop("arrays"))
+                        except ValueError as e:
+                            status, result = "failed", {"error": str(e)}
+                            entry["status"] = status
+                    if status == "ok":
+                        entry.update(result)
+                    else:
+                        entry["error"] = result["error"]
+                    record(entry)
+                    finished += 1
+                    print(f"[{finished}/{len(tasks)}] {part_id}: {status}")
+                elif time.perf_counter() - worker.started > timeout:
+                    part_id, step_file = worker.task
+                    worker.restart()
+                    record({"part_id": part_id, "step_file": step_file, "status": "timeout",
+                            "seconds": round(timeout, 3), "error": f"超过{timeout}秒"})
+                    finished += 1
+                    print(f"[{finished}/{len(tasks)}] {part_id}: timeout")
+    finally:
+        for worker in pool:
+            worker.stop()
+        if writer is not None:
+            writer.close()
+        manifest.close()
+
+    return entries
+
+
+def main():
+    parser = argparse.ArgumentParser(description="并行把STEP文件夹转换为模式2使用的图数据(BIN或分片数据集)")
+    parser.add_argument("input_dir", help="包含STEP文件的文件夹")
+    parser.add_argument("output_dir", help="输出文件夹，清单写入其中的manifest.jsonl")
+    parser.add_argument("-j", "--workers", type=int, default=None, help="工作进程数，默认为CPU核数")
+    parser.add_argument("--timeout", type=float, default=DEFAULT_TIMEOUT, help="单个文件的超时时间(秒)")
+    parser.add_argument("--shards", action="store_true", help="写入分片数据集而不是每个零件一个BIN文件")
+    parser.add_argument("--shard-size", type=int, default=DEFAULT_SHARD_SIZE, help="每个分片的图数量")
+    parser.add_argument("--dtype", choices=FEATURE_DTYPES, default="float32", help="特征保存精度")
+    parser.add_argument("--curv-samples", type=int, default=10, help="边的采样点数")
+    parser.add_argument("--surf-samples", type=int, default=10, help="面的UV采样点数(每个方向)")
+    parser.add_argument("--retry-failed", action="store_true", help="重新处理清单中失败或超时的文件")
+    args = parser.parse_args()
+
+    entries = build_dataset(args.input_dir, args.output_dir, args.workers, args.timeout, args.shards,
+                            args.shard_size, args.dtype, args.curv_samples, args.surf_samples,
+                            args.retry_failed)
+    counts = {}
+    for entry in entries.values():
+        counts[entry["status"]] = counts.get(entry["status"], 0) + 1
+    print(", ".join(f"{status}: {count}" for status, count in sorted(counts.items())))
+
+
+if __name__ == "__main__":
+    main()
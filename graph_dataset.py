@@ -0,0 +1,234 @@
+# graph_dataset.py
+import os
+import json
+import argparse
+import threading
+import numpy as np
+import torch
+import dgl
+
+# 分片数据集格式版本
+GRAPH_DATASET_VERSION = 1
+GRAPH_DATASET_INDEX = "index.json"
+# 每个分片保存的数组，按图连续存放
+SHARD_ARRAYS = ("node_x", "edge_x", "indptr", "indices", "node_offsets", "edge_offsets")
+DEFAULT_SHARD_SIZE = 1024
+FEATURE_DTYPES = ("float32", "float16")
+
+
+def graph_to_arrays(graph):
+    """把DGL图拆成NumPy数组，边按源节点排序(CSR顺序)，边特征随之重排"""
+    src, dst = (t.numpy().astype(np.int64) for t in graph.edges())
+    order = np.argsort(src, kind="stable")
+    indptr = np.zeros(graph.num_nodes() + 1, dtype=np.int64)
+    np.cumsum(np.bincount(src, minlength=graph.num_nodes()), out=indptr[1:])
+    node_x = graph.ndata["x"].numpy()
+    edge_x = graph.edata["x"].numpy()[order] if graph.num_edges() else graph.edata["x"].numpy()
+    return node_x, edge_x, indptr, dst[order]
+
+
+class GraphShardWriter:
+    """把多个(已归一化的)图写入分片数据集
+
+    每个分片是一个目录，包含SHARD_ARRAYS对应的.npy文件，
+    index.json记录特征形状、精度、分片列表和零件id到(分片, 图序号)的映射。
+    打开已有数据集时在其后追加新分片，用于断点续建。
+    """
+
+    def __init__(self, root, shard_size=DEFAULT_SHARD_SIZE, dtype="float32"):
+        if dtype not in FEATURE_DTYPES:
+            raise ValueError(f"不支持的特征精度: {dtype}")
+        self.root = root
+        self.shard_size = shard_size
+        os.makedirs(root, exist_ok=True)
+
+        index_path = os.path.join(root, GRAPH_DATASET_INDEX)
+        if os.path.exists(index_path):
+            with open(index_path, 'r', encoding='utf-8') as f:
+                self.index = json.load(f)
+            if self.index["dtype"] != dtype:
+                raise ValueError(f"数据集精度为{self.index['dtype']}，与{dtype}不一致")
+        else:
+            self.index = {"version": GRAPH_DATASET_VERSION, "dtype": dtype,
+                          "node_shape": None, "edge_shape": None, "shards": [], "parts": {}}
+        self.dtype = np.dtype(dtype)
+        self.pending = []
+
+    def __contains__(self, part_id):
+        return part_id in self.index["parts"] or any(p[0] == part_id for p in self.pending)
+
+    def add(self, part_id, graph):
+        self.add_arrays(part_id, *graph_to_arrays(graph))
+
+    def add_arrays(self, part_id, node_x, edge_x, indptr, indices):
+        """添加graph_to_arrays拆出的数组，供在其他进程中构图时使用"""
+        for key, x in (("node_shape", node_x), ("edge_shape", edge_x)):
+            if len(x) == 0:
+                continue
+            if self.index[key] is None:
+                self.index[key] = list(x.shape[1:])
+            elif list(x.shape[1:]) != self.index[key]:
+                raise ValueError(f"{part_id}的特征形状与数据集不一致")
+
+        self.pending.append((part_id, node_x.astype(self.dtype, copy=False),
+                             edge_x.astype(self.dtype, copy=False), indptr, indices))
+        if len(self.pending) >= self.shard_size:
+            self.flush()
+
+    def flush(self):
+        """把缓冲的图写成一个分片并更新索引"""
+        if not self.pending:
+            return
+        shard_name = f"shard_{len(self.index['shards']):05d}"
+        shard_dir = os.path.join(self.root, shard_name)
+        os.makedirs(shard_dir, exist_ok=True)
+
+        node_counts = np.array([len(p[1]) for p in self.pending], dtype=np.int64)
+        edge_counts = np.array([len(p[4]) for p in self.pending], dtype=np.int64)
+        node_offsets = np.concatenate([[0], np.cumsum(node_counts)])
+        edge_offsets = np.concatenate([[0], np.cumsum(edge_counts)])
+
+        # 分片内使用统一的CSR，节点和边按图连续编号
+        indptr = np.concatenate([[0]] + [p[3][1:] + edge_offsets[i] for i, p in enumerate(self.pending)])
+        indices = np.concatenate([p[4] + node_offsets[i] for i, p in enumerate(self.pending)])
+        # 没有边的图的边特征形状为(0,)，按数据集的边特征形状对齐
+        edge_shape = [-1] + (self.index["edge_shape"] or [])
+        arrays = {
+            "node_x": np.concatenate([p[1] for p in self.pending]),
+            "edge_x": np.concatenate([p[2].reshape(edge_shape) for p in self.pending]),
+            "indptr": indptr.astype(np.int64),
+            "indices": indices.astype(np.int32),
+            "node_offsets": node_offsets,
+            "edge_offsets": edge_offsets,
+        }
+        for name in SHARD_ARRAYS:
+            np.save(os.path.join(shard_dir, f"{name}.npy"), arrays[name])
+
+        shard_id = len(self.index["shards"])
+        self.index["shards"].append({"name": shard_name, "num_graphs": len(self.pending),
+                                     "num_nodes": int(node_offsets[-1]), "num_edges": int(edge_offsets[-1])})
+        for i, (part_id, *_) in enumerate(self.pending):
+            self.index["parts"][part_id] = [shard_id, i]
+        self.pending = []
+        self._write_index()
+
+    def _write_index(self):
+        # 先写临时文件再替换，中断时不会留下损坏的索引
+        index_path = os.path.join(self.root, GRAPH_DATASET_INDEX)
+        with open(index_path + ".tmp", 'w', encoding='utf-8') as f:
+            json.dump(self.index, f, ensure_ascii=False)
+        os.replace(index_path + ".tmp", index_path)
+
+    def close(self):
+        self.flush()
+        self._write_index()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+class GraphShardDataset:
+    """分片数据集读取器，数组以写时复制方式内存映射，图特征不复制
+
+    dataset[i]和dataset.get(part_id)返回与load_one_graph相同结构的样本。
+    分片在第一次访问时加锁打开，读取器可以在多个线程之间共享。
+    """
+
+    def __init__(self, root):
+        if os.path.basename(root) == GRAPH_DATASET_INDEX:
+            root = os.path.dirname(root)
+        self.root = root
+        with open(os.path.join(root, GRAPH_DATASET_INDEX), 'r', encoding='utf-8') as f:
+            self.index = json.load(f)
+        if self.index.get("version") != GRAPH_DATASET_VERSION:
+            raise ValueError("不支持的图数据集版本")
+        self.part_ids = sorted(self.index["parts"], key=lambda p: tuple(self.index["parts"][p]))
+        self.shards = {}
+        self.lock = threading.Lock()
+
+    def _shard(self, shard_id):
+        with self.lock:
+            shard = self.shards.get(shard_id)
+            if shard is None:
+                shard_dir = os.path.join(self.root, self.index["shards"][shard_id]["name"])
+                # mmap_mode="c": 只读映射文件，写入时才复制页面，因此可以直接交给torch
+                shard = {name: np.load(os.path.join(shard_dir, f"{name}.npy"), mmap_mode="c")
+                         for name in SHARD_ARRAYS}
+                self.shards[shard_id] = shard
+            return shard
+
+    def __len__(self):
+        return len(self.part_ids)
+
+    def __contains__(self, part_id):
+        return part_id in self.index["parts"]
+
+    def __getitem__(self, i):
+        return self.get(self.part_ids[i])
+
+    def get(self, part_id):
+        if part_id not in self.index["parts"]:
+            raise KeyError(f"图数据集中没有零件: {part_id}")
+        shard_id, i = self.index["parts"][part_id]
+        shard = self._shard(shard_id)
+        n0, n1 = int(shard["node_offsets"][i]), int(shard["node_offsets"][i + 1])
+        e0, e1 = int(shard["edge_offsets"][i]), int(shard["edge_offsets"][i + 1])
+
+        indptr = torch.from_numpy(np.asarray(shard["indptr"][n0:n1 + 1]) - e0)
+        indices = torch.from_numpy(np.asarray(shard["indices"][e0:e1], dtype=np.int64) - n0)
+        graph = dgl.graph(("csr", (indptr, indices, torch.arange(e1 - e0))), num_nodes=n1 - n0)
+        graph.ndata["x"] = torch.from_numpy(shard["node_x"][n0:n1])
+        graph.edata["x"] = torch.from_numpy(shard["edge_x"][e0:e1])
+        return {"graph": graph, "filename": part_id}
+
+    def __iter__(self):
+        for part_id in self.part_ids:
+            yield self.get(part_id)
+
+
+def is_graph_dataset(path):
+    """路径是图数据集目录或其index.json"""
+    if os.path.isdir(path):
+        path = os.path.join(path, GRAPH_DATASET_INDEX)
+    return os.path.basename(path) == GRAPH_DATASET_INDEX and os.path.exists(path)
+
+
+def main():
+    from preprocessor import load_one_graph, load_graph_batch
+
+    parser = argparse.ArgumentParser(description="把BIN图文件打包成内存映射的分片数据集")
+    parser.add_argument("input_dir", help="包含.bin图文件的文件夹")
+    parser.add_argument("output_dir", help="数据集输出文件夹")
+    parser.add_argument("--shard-size", type=int, default=DEFAULT_SHARD_SIZE, help="每个分片的图数量")
+    parser.add_argument("--dtype", choices=FEATURE_DTYPES, default="float32", help="特征保存精度")
+    args = parser.parse_args()
+
+    bin_files = sorted(f for f in os.listdir(args.input_dir) if f.lower().endswith(".bin"))
+    with GraphShardWriter(args.output_dir, args.shard_size, args.dtype) as writer:
+        bin_files = [f for f in bin_files if os.path.splitext(f)[0] not in writer]
+        for start in range(0, len(bin_files), args.shard_size):
+            chunk = bin_files[start:start + args.shard_size]
+            try:
+                # 每个分片的图一次批量归一化
+                batch = load_graph_batch([os.path.join(args.input_dir, f) for f in chunk])
+                graphs = dgl.unbatch(batch)
+            except Exception:
+                graphs = None
+            for i, file_name in enumerate(chunk):
+                part_id = os.path.splitext(file_name)[0]
+                try:
+                    if graphs is not None:
+                        writer.add(part_id, graphs[i])
+                    else:
+                        # 批量读取失败时逐个读取，跳过出错的文件
+                        writer.add(part_id, load_one_graph(os.path.join(args.input_dir, file_name))["graph"])
+                except Exception as e:
+                    print(f"{file_name}: {str(e)}")
+    print(f"{args.output_dir}: {len(writer.index['parts'])} graphs, {len(writer.index['shards'])} shards")
+
+
+if __name__ == "__main__":
+    main()
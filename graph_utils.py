@@ -1,45 +1,233 @@
 # graph_utils.py
+import sqlite3
 import numpy as np
 import torch
 import dgl
-from occwl.graph import face_adjacency
-from occwl.uvgrid import ugrid, uvgrid
-
-def build_graph(solid, curv_num_u_samples=10, surf_num_u_samples=10, surf_num_v_samples=10):
-    """Convert STEP solid to DGL graph"""
-    # Build face adjacency graph
-    graph = face_adjacency(solid)
-
-    # Compute face UV grid features
-    graph_face_feat = []
-    for face_idx in graph.nodes:
-        face = graph.nodes[face_idx]["face"]
-        points = uvgrid(face, method="point", num_u=surf_num_u_samples, num_v=surf_num_v_samples)
-        normals = uvgrid(face, method="normal", num_u=surf_num_u_samples, num_v=surf_num_v_samples)
-        visibility_status = uvgrid(face, method="visibility_status",
-                               num_u=surf_num_u_samples, num_v=surf_num_v_samples)
-        mask = np.logical_or(visibility_status == 0, visibility_status == 2)
-        face_feat = np.concatenate((points, normals, mask), axis=-1)
-        graph_face_feat.append(face_feat)
-    graph_face_feat = np.asarray(graph_face_feat)
-
-    # Compute edge U grid features
-    graph_edge_feat = []
-    for edge_idx in graph.edges:
-        edge = graph.edges[edge_idx]["edge"]
-        if not edge.has_curve():
+from OCC.Core.TopAbs import TopAbs_SOLID, TopAbs_FACE, TopAbs_EDGE, TopAbs_FORWARD, TopAbs_REVERSED
+from OCC.Core.TopLoc import TopLoc_Location
+from OCC.Core.TopExp import topexp_MapShapes, TopExp_Explorer
+from OCC.Core.TopTools import TopTools_IndexedMapOfShape
+from OCC.Core.TopoDS import TopoDS_Compound, TopoDS_Edge
+from OCC.Core.BRep import BRep_Builder, BRep_Tool
+from face_sampling import sample_face, sample_edge, trimming_mask, face_geometry_hash
+
+# Feature precision used when sampling; occwl returns float64
+FEATURE_DTYPE = np.float32
+
+def _adjacency_from_edge_uses(edge_ids, face_ids, forward, num_edges, num_faces):
+    """Directed face adjacency from (edge, face, edge is forward in face) uses
+
+    Returns src, dst, the edge index of every directed edge and whether it is reversed.
+    """
+    # Keep edges used exactly twice, by two different faces in opposite orientations.
+    # Seams (same face twice), free edges and non-manifold edges are not adjacencies.
+    order = np.argsort(edge_ids, kind="stable")
+    edge_ids, face_ids, forward = edge_ids[order], face_ids[order], forward[order]
+    uses = np.bincount(edge_ids, minlength=num_edges)
+    group_start = np.ones(len(edge_ids), dtype=bool)
+    group_start[1:] = edge_ids[1:] != edge_ids[:-1]
+    first = np.flatnonzero(group_start & (uses[edge_ids] == 2))
+    second = first + 1
+    valid = (face_ids[first] != face_ids[second]) & (forward[first] != forward[second])
+    first, second = first[valid], second[valid]
+    left = np.where(forward[first], face_ids[first], face_ids[second])
+    right = np.where(forward[first], face_ids[second], face_ids[first])
+
+    # Directed edges in creation order: left -> right, then right -> left
+    src = np.stack([left, right], axis=1).ravel()
+    dst = np.stack([right, left], axis=1).ravel()
+    edge_index = np.repeat(edge_ids[first], 2)
+    reversed_edge = np.tile([False, True], len(first))
+
+    # Parallel edges between the same faces behave like networkx DiGraph.add_edge: the pair
+    # keeps the position of its first edge but the data of its last one
+    key = src * max(num_faces, 1) + dst
+    _, first = np.unique(key, return_index=True)
+    _, last_from_end = np.unique(key[::-1], return_index=True)
+    last = len(key) - 1 - last_from_end
+    order = np.argsort(first)
+    first, last = first[order], last[order]
+    # Sort by source face, keeping the order in which each successor was first added
+    order = np.argsort(src[first], kind="stable")
+    first, last = first[order], last[order]
+    return src[first], dst[first], edge_index[last], reversed_edge[last]
+
+def _as_edge(shape):
+    return shape if isinstance(shape, TopoDS_Edge) else TopoDS_Edge(shape)
+
+def face_adjacency_arrays(shape):
+    """Face adjacency of a shape as NumPy arrays, without building a networkx graph
+
+    Returns (faces, edges, src, dst). Faces are in TopExp order, the same node order
+    as occwl's face_adjacency. Every manifold edge with a 3D curve shared by two faces
+    gives a pair of directed edges: left face -> right face with the edge forward, and
+    the opposite direction with the edge reversed; edges without a 3D curve are not
+    adjacencies. Parallel edges between the same faces keep the position of the first
+    and the geometry of the last, as networkx does, and edges are sorted by source face.
+    """
+    face_map = TopTools_IndexedMapOfShape()
+    edge_map = TopTools_IndexedMapOfShape()
+    topexp_MapShapes(shape, TopAbs_FACE, face_map)
+    topexp_MapShapes(shape, TopAbs_EDGE, edge_map)
+    faces = [face_map.FindKey(i) for i in range(1, face_map.Extent() + 1)]
+
+    # Like occwl, edges without a 3D curve (e.g. degenerated edges) are not adjacencies
+    has_curve = np.array([BRep_Tool.IsGeometric(_as_edge(edge_map.FindKey(i)))
+                          for i in range(1, edge_map.Extent() + 1)], dtype=bool)
+
+    # Edge -> face ancestry, with the orientation of the edge in each face
+    edge_ids, face_ids, forward = [], [], []
+    for face_id, face in enumerate(faces):
+        explorer = TopExp_Explorer(face, TopAbs_EDGE)
+        while explorer.More():
+            edge = explorer.Current()
+            edge_ids.append(edge_map.FindIndex(edge) - 1)
+            face_ids.append(face_id)
+            forward.append(edge.Orientation() == TopAbs_FORWARD)
+            explorer.Next()
+    edge_ids = np.asarray(edge_ids, dtype=np.int64)
+    geometric = has_curve[edge_ids]
+    src, dst, edge_index, reversed_edge = _adjacency_from_edge_uses(
+        edge_ids[geometric], np.asarray(face_ids, dtype=np.int64)[geometric],
+        np.asarray(forward, dtype=bool)[geometric], edge_map.Extent(), len(faces))
+    edges = [edge_map.FindKey(int(e) + 1).Oriented(TopAbs_REVERSED if r else TopAbs_FORWARD)
+             for e, r in zip(edge_index, reversed_edge)]
+    return faces, edges, src, dst
+
+def _explore(shape, shape_type):
+    """Subshapes of a type in TopExp_Explorer order, repeats included"""
+    shapes = []
+    explorer = TopExp_Explorer(shape, shape_type)
+    while explorer.More():
+        shapes.append(explorer.Current())
+        explorer.Next()
+    return shapes
+
+def solid_instances(shape):
+    """Solids of a shape grouped by their underlying TShape
+
+    Returns (prototypes, instance_ids, face_prototypes, face_nodes). prototypes holds one
+    location-free solid per unique TShape, and instance_ids the prototype of every solid
+    in TopExp order. A repeated part (bolts, brackets) is one prototype however many
+    locations it is placed at. Faces outside solids (loose shells and faces) form one
+    extra prototype, a compound of those faces, at the end of prototypes.
+
+    face_prototypes and face_nodes give, for every face in TopExp_Explorer order (the
+    order faces are displayed and exported in), its prototype and its node in that
+    prototype's graph.
+    """
+    solid_map = TopTools_IndexedMapOfShape()
+    solids, instance_ids = [], []
+    for solid in _explore(shape, TopAbs_SOLID):
+        # IsSame compares TShape and location, so drop the location before adding
+        instance_ids.append(solid_map.Add(solid.Located(TopLoc_Location())) - 1)
+        solids.append(solid)
+    prototypes = [solid_map.FindKey(i) for i in range(1, solid_map.Extent() + 1)]
+
+    # Graph node of every explored face of a prototype (graph nodes follow the face map)
+    prototype_nodes = []
+    for prototype in prototypes:
+        face_map = TopTools_IndexedMapOfShape()
+        topexp_MapShapes(prototype, TopAbs_FACE, face_map)
+        prototype_nodes.append(np.array([face_map.FindIndex(face) - 1
+                                         for face in _explore(prototype, TopAbs_FACE)], dtype=np.int64))
+
+    # The faces of a solid are contiguous in explorer order; anything between them is loose
+    faces = _explore(shape, TopAbs_FACE)
+    loose_map = TopTools_IndexedMapOfShape()
+    loose_id = len(prototypes)
+    face_prototypes, face_nodes = [np.empty(0, np.int64)], [np.empty(0, np.int64)]
+    position = 0
+    for solid, k in zip(solids, instance_ids):
+        nodes = prototype_nodes[k]
+        if len(nodes) == 0:
+            continue
+        first = _explore(solid, TopAbs_FACE)[0]
+        while position < len(faces) and not faces[position].IsSame(first):
+            face_prototypes.append([loose_id])
+            face_nodes.append([loose_map.Add(faces[position]) - 1])
+            position += 1
+        face_prototypes.append(np.full(len(nodes), k, dtype=np.int64))
+        face_nodes.append(nodes)
+        position += len(nodes)
+    for face in faces[position:]:
+        face_prototypes.append([loose_id])
+        face_nodes.append([loose_map.Add(face) - 1])
+    if position > len(faces):
+        raise ValueError(f"Solid faces do not follow the {len(faces)} explored faces of the shape")
+
+    if loose_map.Extent() > 0:
+        # Faces keep their locations; the compound's face map has the same order as loose_map
+        compound = TopoDS_Compound()
+        builder = BRep_Builder()
+        builder.MakeCompound(compound)
+        for i in range(1, loose_map.Extent() + 1):
+            builder.Add(compound, loose_map.FindKey(i))
+        prototypes.append(compound)
+    return (prototypes, np.asarray(instance_ids, dtype=np.int64),
+            np.concatenate(face_prototypes).astype(np.int64), np.concatenate(face_nodes).astype(np.int64))
+
+def instance_node_index(num_nodes, face_prototypes, face_nodes):
+    """Node index into a batch of prototype graphs for every displayed face"""
+    offsets = np.concatenate([[0], np.cumsum(num_nodes)]).astype(np.int64)
+    return offsets[face_prototypes] + face_nodes
+
+def build_graph(solid, curv_num_u_samples=10, surf_num_u_samples=10, surf_num_v_samples=10,
+                dtype=FEATURE_DTYPE, feature_cache=None):
+    """Convert STEP solid (occwl Solid or TopoDS_Shape) to DGL graph with features of the given dtype
+
+    With a FaceFeatureCache, faces whose geometry hash is already cached reuse their
+    features and only new or changed faces are sampled. Faces whose geometry cannot be
+    hashed exactly (e.g. surfaces of revolution or offset surfaces) are never cached.
+    """
+    shape = solid.topods_shape() if hasattr(solid, "topods_shape") else solid
+    # Build face adjacency straight from the B-rep topology
+    faces, edges, src, dst = face_adjacency_arrays(shape)
+
+    keys, cached = None, {}
+    if feature_cache is not None:
+        hashes = [face_geometry_hash(face, surf_num_u_samples, surf_num_v_samples) for face in faces]
+        keys = [f"{h}-{np.dtype(dtype).name}" if h is not None else None for h in hashes]
+        try:
+            cached = feature_cache.get_many([key for key in keys if key is not None])
+        except sqlite3.Error as e:
+            # The cache is only an optimization: sample every face and skip storing
+            print(f"Feature cache lookup failed, sampling all faces: {e}")
+            keys, cached = None, {}
+
+    # Compute face UV grid features, written straight into a preallocated array
+    graph_face_feat = np.empty((len(faces), surf_num_u_samples, surf_num_v_samples, 7), dtype=dtype)
+    new_features = {}
+    for i, face in enumerate(faces):
+        if keys is not None and keys[i] in cached:
+            graph_face_feat[i] = cached[keys[i]]
+            continue
+        # Planes, cylinders, cones and spheres are evaluated in closed form
+        points, normals = sample_face(face, surf_num_u_samples, surf_num_v_samples)
+        # One classifier per face; untrimmed faces skip classification
+        mask = trimming_mask(face, surf_num_u_samples, surf_num_v_samples)
+        graph_face_feat[i, ..., :3] = points
+        graph_face_feat[i, ..., 3:6] = normals
+        graph_face_feat[i, ..., 6] = mask
+        if keys is not None and keys[i] is not None:
+            new_features[keys[i]] = graph_face_feat[i]
+    if new_features:
+        try:
+            feature_cache.put_many(new_features)
+        except sqlite3.Error as e:
+            print(f"Feature cache store failed: {e}")
+
+    # Compute edge U grid features; every adjacency edge has a 3D curve, zeros are only a fallback
+    graph_edge_feat = np.zeros((len(edges), curv_num_u_samples, 6), dtype=dtype)
+    for i, edge in enumerate(edges):
+        grid = sample_edge(edge, curv_num_u_samples)
+        if grid is None:
             continue
-        points = ugrid(edge, method="point", num_u=curv_num_u_samples)
-        tangents = ugrid(edge, method="tangent", num_u=curv_num_u_samples)
-        edge_feat = np.concatenate((points, tangents), axis=-1)
-        graph_edge_feat.append(edge_feat)
-    graph_edge_feat = np.asarray(graph_edge_feat)
+        graph_edge_feat[i, :, :3] = grid[0]
+        graph_edge_feat[i, :, 3:] = grid[1]
 
     # Convert to DGL graph
-    edges = list(graph.edges)
-    src = [e[0] for e in edges]
-    dst = [e[1] for e in edges]
-    dgl_graph = dgl.graph((src, dst), num_nodes=len(graph.nodes))
+    dgl_graph = dgl.graph((torch.from_numpy(src), torch.from_numpy(dst)), num_nodes=len(faces))
     dgl_graph.ndata["x"] = torch.from_numpy(graph_face_feat)
     dgl_graph.edata["x"] = torch.from_numpy(graph_edge_feat)
-    return dgl_graph
\ No newline at end of file
+    return dgl_graph
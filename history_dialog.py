@@ -1,13 +1,19 @@
 # history_dialog.py
+from datetime import date, timedelta
 from PyQt5.QtWidgets import (
-    QDialog, QVBoxLayout, QPushButton, QTableWidget, QTableWidgetItem,
-    QMessageBox, QHBoxLayout
+    QDialog, QVBoxLayout, QPushButton, QTableView, QHeaderView, QAbstractItemView,
+    QMessageBox, QHBoxLayout, QComboBox, QLineEdit, QLabel
 )
-from PyQt5.QtCore import Qt
+from PyQt5.QtCore import Qt, QTimer
+from history_model import HistoryTableModel
+
+# 日期过滤选项: (显示文本, 向前的天数)，None表示不限
+DATE_FILTERS = [("全部日期", None), ("今天", 0), ("最近7天", 6), ("最近30天", 29)]
+MODE_FILTERS = [("全部模式", None), ("模式1", "模式1"), ("模式2", "模式2"), ("模式3", "模式3")]
 
 
 class HistoryDialog(QDialog):
-    def __init__(self, history_data, parent=None):
+    def __init__(self, history_store, parent=None):
         super().__init__(parent)
         self.setWindowTitle("处理历史记录")
         self.resize(800, 600)
@@ -18,6 +24,34 @@ class HistoryDialog(QDialog):
         main_layout.setSpacing(10)
         self.setLayout(main_layout)
 
+        # 过滤条件
+        filter_layout = QHBoxLayout()
+        filter_layout.setSpacing(10)
+        self.dateCombo = QComboBox()
+        self.dateCombo.addItems([text for text, days in DATE_FILTERS])
+        self.dateCombo.currentIndexChanged.connect(self.apply_filters)
+        filter_layout.addWidget(self.dateCombo)
+
+        self.modeCombo = QComboBox()
+        self.modeCombo.addItems([text for text, mode in MODE_FILTERS])
+        self.modeCombo.currentIndexChanged.connect(self.apply_filters)
+        filter_layout.addWidget(self.modeCombo)
+
+        self.fileEdit = QLineEdit()
+        self.fileEdit.setPlaceholderText("按文件名过滤")
+        self.fileEdit.setClearButtonEnabled(True)
+        # 输入停顿后再查询数据库
+        self.file_filter_timer = QTimer(self)
+        self.file_filter_timer.setSingleShot(True)
+        self.file_filter_timer.setInterval(200)
+        self.file_filter_timer.timeout.connect(self.apply_filters)
+        self.fileEdit.textChanged.connect(self.file_filter_timer.start)
+        filter_layout.addWidget(self.fileEdit, 1)
+
+        self.countLabel = QLabel()
+        filter_layout.addWidget(self.countLabel)
+        main_layout.addLayout(filter_layout)
+
         # 按钮布局
         button_layout = QHBoxLayout()
         button_layout.setSpacing(10)
@@ -37,6 +71,21 @@ class HistoryDialog(QDialog):
         self.clearButton.clicked.connect(self.clear_history)
         button_layout.addWidget(self.clearButton)
 
+        self.viewButton = QPushButton("查看")
+        self.viewButton.setStyleSheet("""
+            QPushButton {
+                background-color: #4a6fa5;
+                color: white;
+                padding: 5px 15px;
+                border-radius: 4px;
+            }
+            QPushButton:hover {
+                background-color: #5a7fb5;
+            }
+        """)
+        self.viewButton.clicked.connect(self.view_selected)
+        button_layout.addWidget(self.viewButton)
+
         close_btn = QPushButton("关闭")
         close_btn.setStyleSheet("""
             QPushButton {
@@ -55,15 +104,23 @@ class HistoryDialog(QDialog):
 
         main_layout.addLayout(button_layout)
 
-        # 表格
-        self.table = QTableWidget()
-        self.table.setColumnCount(5)
-        self.table.setHorizontalHeaderLabels(["时间", "模式", "STEP文件", "附加文件", "操作"])
+        # 表格，行随滚动分页读取
+        self.history_store = history_store
+        self.model = HistoryTableModel(history_store, parent=self)
+        self.table = QTableView()
+        self.table.setModel(self.model)
+        self.table.setSelectionBehavior(QAbstractItemView.SelectRows)
+        self.table.setSelectionMode(QAbstractItemView.SingleSelection)
+        self.table.setEditTriggers(QAbstractItemView.NoEditTriggers)
+        self.table.verticalHeader().setVisible(False)
+        self.table.verticalHeader().setDefaultSectionSize(24)
         self.table.horizontalHeader().setStretchLastSection(True)
-        self.table.setSelectionBehavior(QTableWidget.SelectRows)
-        self.table.setEditTriggers(QTableWidget.NoEditTriggers)
+        self.table.horizontalHeader().setSectionResizeMode(QHeaderView.Interactive)
+        self.table.horizontalHeader().setSortIndicator(0, Qt.DescendingOrder)
+        self.table.setSortingEnabled(True)
+        self.table.doubleClicked.connect(lambda index: self.view_result(index.row()))
         self.table.setStyleSheet("""
-            QTableWidget {
+            QTableView {
                 border: 1px solid #d1d9e6;
                 border-radius: 4px;
             }
@@ -75,36 +132,32 @@ class HistoryDialog(QDialog):
         """)
         main_layout.addWidget(self.table, 1)  # 添加伸缩因子使表格占据剩余空间
 
-        self.history_data = history_data
-        self.populate_table()
-
-    def populate_table(self):
-        """填充表格数据"""
-        self.table.setRowCount(len(self.history_data))
-        for row, item in enumerate(self.history_data):
-            self.table.setItem(row, 0, QTableWidgetItem(item["time"]))
-            self.table.setItem(row, 1, QTableWidgetItem(item["mode"]))
-            self.table.setItem(row, 2, QTableWidgetItem(item["step_file"]))
-            self.table.setItem(row, 3, QTableWidgetItem(item["extra_file"]))
-
-            btn = QPushButton("查看")
-            btn.setStyleSheet("""
-                QPushButton {
-                    background-color: #4a6fa5;
-                    color: white;
-                    padding: 3px 8px;
-                    border-radius: 3px;
-                    min-width: 60px;
-                }
-                QPushButton:hover {
-                    background-color: #5a7fb5;
-                }
-            """)
-            btn.clicked.connect(lambda _, r=row: self.view_result(r))
-            self.table.setCellWidget(row, 4, btn)
+        self.model.modelReset.connect(self.update_count_label)
+        self.update_count_label()
+
+    def apply_filters(self):
+        """按日期、模式和文件名过滤"""
+        days = DATE_FILTERS[self.dateCombo.currentIndex()][1]
+        date_from = (date.today() - timedelta(days=days)).isoformat() if days is not None else None
+        self.model.set_filters(
+            mode=MODE_FILTERS[self.modeCombo.currentIndex()][1],
+            file_text=self.fileEdit.text(),
+            date_from=date_from,
+        )
+
+    def update_count_label(self):
+        self.countLabel.setText(f"共 {self.model.total} 条记录")
+
+    def view_selected(self):
+        rows = self.table.selectionModel().selectedRows()
+        if rows:
+            self.view_result(rows[0].row())
 
     def view_result(self, row):
-        self.parent_ref.load_from_history(self.history_data[row])
+        record = self.model.record(row)
+        if record is None:
+            return
+        self.parent_ref.load_from_history(record)
         self.close()
 
     def clear_history(self):
@@ -116,10 +169,8 @@ class HistoryDialog(QDialog):
         )
 
         if reply == QMessageBox.Yes:
-            self.history_data.clear()
-            self.parent_ref.history.clear()  # 同时清除父窗口的历史记录
-            self.populate_table()  # 刷新表格显示
-            self.parent_ref.save_history()  # 保存空历史到文件
+            self.history_store.clear()
+            self.model.refresh()  # 刷新表格显示
 
             QMessageBox.information(
                 self, '完成',
@@ -0,0 +1,124 @@
+# history_model.py
+from PyQt5.QtCore import Qt, QAbstractTableModel, QModelIndex
+from constants import HISTORY_PAGE_SIZE
+
+# 记录字典
+HISTORY_RECORD_ROLE = Qt.UserRole
+
+# (表头, 排序列)，排序列为None的列不可排序
+HISTORY_COLUMNS = [
+    ("时间", "time"),
+    ("模式", "mode"),
+    ("STEP文件", "step_file"),
+    ("附加文件", "extra_file"),
+    ("面数", "face_count"),
+    ("类别分布", None),
+]
+
+
+def summarize_counts(names, counts, top=3):
+    """类别分布摘要(前几个类别的占比)和完整分布文本"""
+    total = sum(counts)
+    if total == 0:
+        return "", ""
+    items = sorted(((count, i) for i, count in enumerate(counts) if count > 0), reverse=True)
+    items = [(names[i] if i < len(names) else f"标签 {i}", count) for count, i in items]
+    summary = ", ".join(f"{name} {count / total * 100:.0f}%" for name, count in items[:top])
+    details = "\n".join(f"{name}: {count} ({count / total * 100:.1f}%)" for name, count in items)
+    return summary, details
+
+
+class HistoryTableModel(QAbstractTableModel):
+    """历史记录表格模型，滚动时按页从数据库读取元数据"""
+
+    def __init__(self, store, page_size=HISTORY_PAGE_SIZE, parent=None):
+        super().__init__(parent)
+        self.store = store
+        self.page_size = page_size
+        self.records = []
+        self.total = 0
+        self.sort_column = "time"
+        self.descending = True
+        self.filters = {}
+        self.refresh()
+
+    def refresh(self):
+        """按当前排序和过滤条件重新读取第一页"""
+        self.beginResetModel()
+        self.total = self.store.count_records(**self.filters)
+        self.records = self._fetch_page(0)
+        self.endResetModel()
+
+    def set_filters(self, mode=None, file_text="", date_from=None, date_to=None):
+        self.filters = {"mode": mode, "file_text": file_text.strip(),
+                        "date_from": date_from, "date_to": date_to}
+        self.refresh()
+
+    def sort(self, column, order=Qt.AscendingOrder):
+        sort_column = HISTORY_COLUMNS[column][1] if 0 <= column < len(HISTORY_COLUMNS) else None
+        if sort_column is None:
+            return
+        self.sort_column = sort_column
+        self.descending = order == Qt.DescendingOrder
+        self.refresh()
+
+    def _fetch_page(self, offset):
+        records = self.store.query_records(offset, self.page_size, self.sort_column,
+                                           self.descending, **self.filters)
+        for record in records:
+            # 分布摘要在读取时算好，绘制表格时不再计算
+            record["summary"], record["distribution"] = summarize_counts(
+                record["label_names"], record["label_counts"])
+        return records
+
+    def canFetchMore(self, parent=QModelIndex()):
+        return not parent.isValid() and len(self.records) < self.total
+
+    def fetchMore(self, parent=QModelIndex()):
+        if parent.isValid():
+            return
+        records = self._fetch_page(len(self.records))
+        if not records:
+            # 数据库在打开对话框后被修改
+            self.total = len(self.records)
+            return
+        self.beginInsertRows(QModelIndex(), len(self.records), len(self.records) + len(records) - 1)
+        self.records.extend(records)
+        self.endInsertRows()
+
+    def record(self, row):
+        return self.records[row] if 0 <= row < len(self.records) else None
+
+    def rowCount(self, parent=QModelIndex()):
+        if parent.isValid():
+            return 0
+        return len(self.records)
+
+    def columnCount(self, parent=QModelIndex()):
+        if parent.isValid():
+            return 0
+        return len(HISTORY_COLUMNS)
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if orientation == Qt.Horizontal and role == Qt.DisplayRole:
+            return HISTORY_COLUMNS[section][0]
+        return super().headerData(section, orientation, role)
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid() or index.row() >= len(self.records):
+            return None
+
+        record = self.records[index.row()]
+        if role == HISTORY_RECORD_ROLE:
+            return record
+
+        key = HISTORY_COLUMNS[index.column()][1]
+        if role == Qt.DisplayRole:
+            if key is None:
+                return record["summary"]
+            return str(record[key])
+        if role == Qt.ToolTipRole and key is None:
+            return record["distribution"]
+        if role == Qt.TextAlignmentRole and key == "face_count":
+            return int(Qt.AlignRight | Qt.AlignVCenter)
+        return None
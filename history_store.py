@@ -0,0 +1,214 @@
+# history_store.py
+import os
+import json
+import zlib
+import sqlite3
+import numpy as np
+from label_store import smallest_label_dtype
+from constants import HISTORY_DB_PATH, HISTORY_MAX_RECORDS
+
+# 列表中显示的字段，不包含标签数据
+METADATA_COLUMNS = ("id", "time", "mode", "step_file", "extra_file", "step_path", "extra_path",
+                    "face_count", "label_names", "label_colors", "label_counts")
+JSON_COLUMNS = ("label_names", "label_colors", "label_counts")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS history (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    time TEXT NOT NULL,
+    mode TEXT NOT NULL,
+    step_file TEXT NOT NULL,
+    extra_file TEXT NOT NULL DEFAULT '',
+    step_path TEXT NOT NULL,
+    extra_path TEXT NOT NULL DEFAULT '',
+    face_count INTEGER NOT NULL,
+    label_names TEXT NOT NULL,
+    label_colors TEXT NOT NULL,
+    label_counts TEXT NOT NULL,
+    label_dtype TEXT NOT NULL,
+    labels BLOB NOT NULL
+)
+"""
+INDEXES = (
+    "CREATE INDEX IF NOT EXISTS history_time ON history (time)",
+    "CREATE INDEX IF NOT EXISTS history_mode ON history (mode)",
+    "CREATE INDEX IF NOT EXISTS history_step_file ON history (step_file)",
+)
+# 可排序的列
+SORT_COLUMNS = ("id", "time", "mode", "step_file", "extra_file", "face_count")
+
+
+def compress_labels(labels):
+    """以最小的整数类型压缩标签，返回(dtype字符串, 压缩数据)"""
+    labels = np.asarray(labels)
+    if labels.size and labels.dtype.kind in "iu" and labels.min() >= 0:
+        labels = labels.astype(smallest_label_dtype(int(labels.max())), copy=False)
+    labels = np.ascontiguousarray(labels)
+    return labels.dtype.str, zlib.compress(labels.tobytes(), 6)
+
+
+def decompress_labels(dtype, blob):
+    return np.frombuffer(zlib.decompress(blob), dtype=np.dtype(dtype))
+
+
+class HistoryStore:
+    """SQLite历史记录，标签压缩后单独存放，列表只读取元数据
+
+    每条记录添加时立即写入，超出保留数量的旧记录随之删除。
+    """
+
+    def __init__(self, db_path=HISTORY_DB_PATH, max_records=HISTORY_MAX_RECORDS):
+        self.db_path = db_path
+        self.max_records = max_records
+        self.connection = sqlite3.connect(db_path)
+        self.connection.row_factory = sqlite3.Row
+        self.connection.execute(SCHEMA)
+        for index in INDEXES:
+            self.connection.execute(index)
+        self.connection.commit()
+
+    def add(self, record, labels):
+        """添加一条记录，record中的label_info只保存类别名称、颜色和数量，返回记录id"""
+        with self.connection:
+            record_id = self._insert(record, labels)
+            self._prune()
+        return record_id
+
+    def _insert(self, record, labels):
+        """插入一条记录，不提交事务"""
+        label_info = record["label_info"]
+        dtype, blob = compress_labels(labels)
+        cursor = self.connection.execute(
+            "INSERT INTO history (time, mode, step_file, extra_file, step_path, extra_path, face_count,"
+            " label_names, label_colors, label_counts, label_dtype, labels)"
+            " VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (record["time"], record["mode"], record["step_file"], record["extra_file"],
+             record["step_path"], record["extra_path"], len(labels),
+             json.dumps(label_info["names"], ensure_ascii=False),
+             json.dumps(label_info["colors"]), json.dumps(label_info["counts"]),
+             dtype, sqlite3.Binary(blob))
+        )
+        return cursor.lastrowid
+
+    def _prune(self):
+        if self.max_records and self.max_records > 0:
+            self.connection.execute(
+                "DELETE FROM history WHERE id NOT IN (SELECT id FROM history ORDER BY id DESC LIMIT ?)",
+                (self.max_records,)
+            )
+
+    def set_max_records(self, max_records):
+        self.max_records = max_records
+        with self.connection:
+            self._prune()
+
+    @staticmethod
+    def _where(mode=None, file_text="", date_from=None, date_to=None):
+        """按模式、文件名和日期(YYYY-MM-DD)过滤的WHERE子句和参数"""
+        clauses, params = [], []
+        if mode:
+            clauses.append("mode = ?")
+            params.append(mode)
+        if file_text:
+            clauses.append("(step_file LIKE ? ESCAPE '\\' OR extra_file LIKE ? ESCAPE '\\')")
+            pattern = "%" + file_text.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%"
+            params += [pattern, pattern]
+        if date_from:
+            clauses.append("time >= ?")
+            params.append(date_from)
+        if date_to:
+            # 时间格式为"YYYY-MM-DD HH:MM:SS"，按字符串比较即按时间比较
+            clauses.append("time < ?")
+            params.append(date_to + "~")
+        return (" WHERE " + " AND ".join(clauses)) if clauses else "", params
+
+    def query_records(self, offset=0, limit=None, sort_column="id", descending=True, **filters):
+        """分页查询记录元数据，filters见_where"""
+        if sort_column not in SORT_COLUMNS:
+            sort_column = "id"
+        where, params = self._where(**filters)
+        order = "DESC" if descending else "ASC"
+        sql = (f"SELECT {', '.join(METADATA_COLUMNS)} FROM history{where}"
+               f" ORDER BY {sort_column} {order}, id {order} LIMIT ? OFFSET ?")
+        rows = self.connection.execute(sql, params + [-1 if limit is None else limit, offset]).fetchall()
+        return [self._to_record(row) for row in rows]
+
+    def count_records(self, **filters):
+        where, params = self._where(**filters)
+        return self.connection.execute(f"SELECT COUNT(*) FROM history{where}", params).fetchone()[0]
+
+    @staticmethod
+    def _to_record(row):
+        record = dict(row)
+        for column in JSON_COLUMNS:
+            record[column] = json.loads(record[column])
+        record["label_info"] = {
+            "names": record["label_names"],
+            "colors": record["label_colors"],
+            "counts": record["label_counts"],
+            "total_faces": record["face_count"],
+        }
+        return record
+
+    def load_labels(self, record_id):
+        """读取并解压一条记录的标签，记录不存在时返回None"""
+        row = self.connection.execute(
+            "SELECT label_dtype, labels FROM history WHERE id = ?", (record_id,)
+        ).fetchone()
+        if row is None:
+            return None
+        return decompress_labels(row["label_dtype"], row["labels"])
+
+    def count(self):
+        return self.connection.execute("SELECT COUNT(*) FROM history").fetchone()[0]
+
+    def clear(self):
+        with self.connection:
+            self.connection.execute("DELETE FROM history")
+
+    @staticmethod
+    def _legacy_record(record):
+        """旧版JSON历史记录转换为(record, 标签)，标签无效(非整数或为负数)时返回None"""
+        if not isinstance(record, dict):
+            return None
+        label_info = record.get("label_info") or {}
+        names = label_info.get("names", [])
+        try:
+            labels = np.asarray(record.get("labels", []), dtype=np.int64).reshape(-1)
+        except (TypeError, ValueError):
+            return None
+        if labels.size and labels.min() < 0:
+            return None
+        counts = label_info.get("counts")
+        if counts is None:
+            counts = np.bincount(labels, minlength=len(names)).tolist() if labels.size else [0] * len(names)
+        return {
+            "time": record.get("time", ""),
+            "mode": record.get("mode", ""),
+            "step_file": record.get("step_file", ""),
+            "extra_file": record.get("extra_file", ""),
+            "step_path": record.get("step_path", ""),
+            "extra_path": record.get("extra_path", ""),
+            "label_info": {"names": names, "colors": label_info.get("colors", []), "counts": counts},
+        }, labels
+
+    def import_json(self, json_path):
+        """导入旧版JSON历史文件，返回(导入的记录数, 跳过的无效记录数)
+
+        所有记录在一个事务中写入，出错时全部回滚；提交成功后才将文件改名，以免重复导入。
+        """
+        with open(json_path, 'r', encoding='utf-8') as f:
+            records = json.load(f)
+        if not isinstance(records, list):
+            raise ValueError("旧版历史文件格式无效")
+        converted = [self._legacy_record(record) for record in records]
+        valid = [item for item in converted if item is not None]
+        with self.connection:
+            for record, labels in valid:
+                self._insert(record, labels)
+            self._prune()
+        os.replace(json_path, json_path + ".migrated")
+        return len(valid), len(converted) - len(valid)
+
+    def close(self):
+        self.connection.close()
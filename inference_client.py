@@ -0,0 +1,176 @@
+# inference_client.py
+import os
+import json
+import time
+import argparse
+import threading
+import urllib.request
+import urllib.error
+import numpy as np
+from seg_io import decode_seg_binary, write_seg_text
+
+DEFAULT_URL = "http://127.0.0.1:8765"
+
+
+def _request(url, data=None, content_type=None, timeout=600):
+    request = urllib.request.Request(url, data=data, headers={"Content-Type": content_type} if content_type else {})
+    try:
+        with urllib.request.urlopen(request, timeout=timeout) as response:
+            return response.read(), response.headers.get("Content-Type", "")
+    except urllib.error.HTTPError as e:
+        try:
+            message = json.loads(e.read())["error"]
+        except Exception:
+            message = e.reason
+        raise RuntimeError(f"服务器返回{e.code}: {message}") from None
+
+
+def health(url=DEFAULT_URL, timeout=10):
+    body, _ = _request(url.rstrip("/") + "/health", timeout=timeout)
+    return json.loads(body)
+
+
+def segment_request(url=DEFAULT_URL, step_file=None, bin_file=None, upload=False, binary=False,
+                    probabilities=False, timeout=600):
+    """请求分割一个零件，返回服务器的响应内容(二进制SEG或JSON的字节)
+
+    upload为False时只发送路径(服务器与客户端在同一台机器)，否则上传文件内容。
+    """
+    url = url.rstrip("/") + "/segment"
+    result_format = "binary" if binary else "json"
+    if upload:
+        upload_type, path = ("bin", bin_file) if bin_file else ("step", step_file)
+        with open(path, 'rb') as f:
+            data = f.read()
+        query = f"?type={upload_type}&format={result_format}&probabilities={int(probabilities)}"
+        body, content_type = _request(url + query, data, "application/octet-stream", timeout)
+    else:
+        options = {"format": result_format, "probabilities": probabilities}
+        if step_file:
+            options["step_path"] = os.path.abspath(step_file)
+        if bin_file:
+            options["bin_path"] = os.path.abspath(bin_file)
+        body, content_type = _request(url, json.dumps(options).encode("utf-8"), "application/json", timeout)
+    return body
+
+
+def segment(url=DEFAULT_URL, step_file=None, bin_file=None, upload=False, binary=False,
+            probabilities=False, timeout=600):
+    """请求分割一个零件
+
+    binary为True时返回(标签, 标签配置哈希)，否则返回服务器的JSON结果。
+    """
+    body = segment_request(url, step_file, bin_file, upload, binary, probabilities, timeout)
+    if binary:
+        return decode_seg_binary(body)
+    return json.loads(body)
+
+
+def load_test(url, step_files, concurrency=8, requests=None, upload=False, binary=True, timeout=600):
+    """用多个线程并发请求，统计吞吐量和延迟(秒)
+
+    requests为总请求数，默认每个文件一次；文件循环使用。
+    """
+    total = requests or len(step_files)
+    latencies, errors = [], []
+    lock = threading.Lock()
+    next_request = iter(range(total))
+
+    def worker():
+        while True:
+            with lock:
+                i = next(next_request, None)
+            if i is None:
+                return
+            start = time.perf_counter()
+            try:
+                segment(url, step_file=step_files[i % len(step_files)], upload=upload, binary=binary,
+                        timeout=timeout)
+                with lock:
+                    latencies.append(time.perf_counter() - start)
+            except Exception as e:
+                with lock:
+                    errors.append(f"{os.path.basename(step_files[i % len(step_files)])}: {str(e)}")
+
+    start = time.perf_counter()
+    threads = [threading.Thread(target=worker) for _ in range(min(concurrency, total))]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    seconds = time.perf_counter() - start
+
+    stats = {"requests": total, "ok": len(latencies), "errors": len(errors), "seconds": seconds,
+             "throughput": len(latencies) / seconds if seconds > 0 else 0.0}
+    if latencies:
+        for name, q in (("p50", 50), ("p90", 90), ("p99", 99)):
+            stats[name] = float(np.percentile(latencies, q))
+        stats["max"] = max(latencies)
+    return stats, errors
+
+
+def find_step_files(path):
+    """文件夹中的STEP文件(递归)，文件直接返回"""
+    if not os.path.isdir(path):
+        return [path]
+    step_files = []
+    for root, _, files in os.walk(path):
+        step_files.extend(os.path.join(root, f) for f in files if f.lower().endswith(('.step', '.stp')))
+    return sorted(step_files)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="分割推理服务器的客户端和压力测试")
+    parser.add_argument("--url", default=DEFAULT_URL, help="服务器地址")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    subparsers.add_parser("health", help="查看服务器状态")
+
+    segment_parser = subparsers.add_parser("segment", help="分割一个零件")
+    segment_parser.add_argument("step_file", nargs="?", help="STEP文件")
+    segment_parser.add_argument("--bin", dest="bin_file", help="BIN文件或图数据集index.json")
+    segment_parser.add_argument("--upload", action="store_true", help="上传文件内容而不是发送路径")
+    segment_parser.add_argument("-o", "--output", help="保存标签(.seg或.segb)，否则打印JSON结果")
+
+    test_parser = subparsers.add_parser("loadtest", help="并发请求压力测试")
+    test_parser.add_argument("inputs", nargs="+", help="STEP文件或包含STEP文件的文件夹")
+    test_parser.add_argument("-c", "--concurrency", type=int, default=8, help="并发请求数")
+    test_parser.add_argument("-n", "--requests", type=int, default=None, help="总请求数，默认每个文件一次")
+    test_parser.add_argument("--upload", action="store_true", help="上传文件内容而不是发送路径")
+    test_parser.add_argument("--json", action="store_true", help="请求JSON结果而不是二进制结果")
+    args = parser.parse_args()
+
+    if args.command == "health":
+        print(json.dumps(health(args.url), ensure_ascii=False, indent=2))
+    elif args.command == "segment":
+        if not args.step_file and not args.bin_file:
+            parser.error("需要STEP文件或--bin")
+        if args.output:
+            body = segment_request(args.url, args.step_file, args.bin_file, args.upload, binary=True)
+            labels, _ = decode_seg_binary(body)
+            if args.output.lower().endswith(".segb"):
+                # 原样保存服务器的结果，保留其中的标签配置哈希
+                with open(args.output, 'wb') as f:
+                    f.write(body)
+            else:
+                write_seg_text(args.output, labels)
+            print(f"{args.output}: {len(labels)} faces")
+        else:
+            result = segment(args.url, args.step_file, args.bin_file, args.upload)
+            print(json.dumps(result, ensure_ascii=False))
+    else:
+        step_files = []
+        for path in args.inputs:
+            step_files.extend(find_step_files(path))
+        if not step_files:
+            parser.error("没有找到STEP文件")
+        stats, errors = load_test(args.url, step_files, args.concurrency, args.requests, args.upload,
+                                  binary=not args.json)
+        for error in errors[:10]:
+            print(error)
+        print(", ".join(f"{key}: {value:.3f}" if isinstance(value, float) else f"{key}: {value}"
+                        for key, value in stats.items()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,281 @@
+# inference_server.py
+import os
+import json
+import time
+import queue
+import argparse
+import tempfile
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+import torch
+import dgl
+from inference_service import InferenceService
+from seg_io import encode_seg_binary
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8765
+# 等待更多请求合并成一批的时间(毫秒)和每批的节点(面)数上限
+DEFAULT_BATCH_WINDOW_MS = 10
+DEFAULT_MAX_BATCH_NODES = 100000
+MAX_UPLOAD_BYTES = 512 * 1024 * 1024
+UPLOAD_SUFFIXES = {"step": ".step", "bin": ".bin"}
+PATH_OPTIONS = ("step_path", "bin_path")
+
+
+class BatchJob:
+    """等待推理的一个请求，inputs为已归一化并转换好布局的图"""
+
+    def __init__(self, inputs, node_index, info):
+        self.inputs = inputs
+        self.node_index = node_index
+        self.info = info
+        self.num_nodes = inputs.num_nodes()
+        self.submitted = time.perf_counter()
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class MicroBatcher:
+    """把并发请求合并为一个dgl.batch推理
+
+    第一个请求到达后最多再等待window秒，合并的节点数不超过max_nodes
+    (单个请求超过上限时单独成批)。一批推理失败时逐个重试，只让出错的请求失败。
+    """
+
+    def __init__(self, service, window_ms=DEFAULT_BATCH_WINDOW_MS, max_nodes=DEFAULT_MAX_BATCH_NODES):
+        self.service = service
+        self.window = window_ms / 1000.0
+        self.max_nodes = max_nodes
+        self.queue = queue.Queue()
+        self.lock = threading.Lock()
+        self.stats = {"requests": 0, "batches": 0, "nodes": 0}
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def submit(self, inputs, node_index=None, info=None):
+        """提交一个请求并等待结果"""
+        job = BatchJob(inputs, node_index, info or {})
+        self.queue.put(job)
+        job.done.wait()
+        if job.error is not None:
+            raise job.error
+        return job.result
+
+    def stop(self):
+        self.queue.put(None)
+        self.thread.join()
+
+    def _collect(self, first):
+        """从第一个请求开始收集一批，返回(批, 留给下一批的请求, 是否停止)"""
+        jobs, nodes = [first], first.num_nodes
+        deadline = time.perf_counter() + self.window
+        while nodes < self.max_nodes:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                break
+            try:
+                job = self.queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            if job is None:
+                return jobs, None, True
+            if nodes + job.num_nodes > self.max_nodes:
+                return jobs, job, False
+            jobs.append(job)
+            nodes += job.num_nodes
+        return jobs, None, False
+
+    def _run(self):
+        carry = None
+        stopping = False
+        while not stopping or carry is not None:
+            first = carry if carry is not None else self.queue.get()
+            if first is None:
+                break
+            jobs, carry, stop = self._collect(first)
+            stopping = stopping or stop
+            self._process(jobs)
+
+    def _process(self, jobs):
+        start = time.perf_counter()
+        try:
+            batch = jobs[0].inputs if len(jobs) == 1 else dgl.batch([job.inputs for job in jobs])
+            logits = self.service.predict(batch)
+            seconds = time.perf_counter() - start
+            chunks = torch.split(logits, [job.num_nodes for job in jobs])
+            for job, chunk in zip(jobs, chunks):
+                self._finish(job, chunk, seconds, len(jobs), start)
+        except Exception as e:
+            if len(jobs) == 1:
+                jobs[0].error = e
+                jobs[0].done.set()
+            else:
+                for job in jobs:
+                    self._process([job])
+            return
+
+        with self.lock:
+            self.stats["batches"] += 1
+            self.stats["requests"] += len(jobs)
+            self.stats["nodes"] += sum(job.num_nodes for job in jobs)
+
+    def _finish(self, job, logits, seconds, batch_size, start):
+        try:
+            job.result = self.service.result(logits, job.node_index, job.info,
+                                             {"queue": start - job.submitted, "inference": seconds,
+                                              "batch_size": batch_size})
+        except Exception as e:
+            job.error = e
+        job.done.set()
+
+
+def result_json(result, probabilities=False):
+    data = {
+        "face_count": result.face_count,
+        "labels": result.labels.tolist(),
+        "counts": list(result.counts),
+        "timings": dict(result.timings),
+        "instance_stats": dict(result.instance_stats) if result.instance_stats else None,
+        "feature_cache_stats": dict(result.feature_cache_stats) if result.feature_cache_stats else None,
+    }
+    if probabilities:
+        data["probabilities"] = result.probabilities.round(4).tolist()
+    return data
+
+
+class InferenceRequestHandler(BaseHTTPRequestHandler):
+    """GET /health: 服务状态
+    POST /segment: JSON请求体{"step_path"或"bin_path", "format", "probabilities"}，
+    或上传文件内容(查询参数type=step|bin)；format=json返回JSON，format=binary返回二进制SEG
+    """
+
+    server_version = "CADSegmentation/1.0"
+
+    def do_GET(self):
+        if urlparse(self.path).path != "/health":
+            self._send_json(404, {"error": "未知的路径"})
+            return
+        with self.server.batcher.lock:
+            stats = dict(self.server.batcher.stats)
+        stats["mean_batch_size"] = stats["requests"] / stats["batches"] if stats["batches"] else 0.0
+        self._send_json(200, {"status": "ok", "model": self.server.model_name, **stats})
+
+    def do_POST(self):
+        url = urlparse(self.path)
+        if url.path != "/segment":
+            self._send_json(404, {"error": "未知的路径"})
+            return
+
+        upload_path = None
+        try:
+            length = int(self.headers.get("Content-Length", 0))
+            if length > MAX_UPLOAD_BYTES:
+                raise ValueError("请求体过大")
+            body = self.rfile.read(length)
+            query = {key: values[-1] for key, values in parse_qs(url.query).items()}
+
+            if self.headers.get("Content-Type", "").startswith("application/json"):
+                options = json.loads(body or b"{}")
+                if not isinstance(options, dict):
+                    raise ValueError("JSON请求体必须是对象")
+            else:
+                # 上传的文件写入临时文件，OCC和DGL都从路径读取
+                upload_type = query.get("type", "step")
+                if upload_type not in UPLOAD_SUFFIXES:
+                    raise ValueError(f"不支持的上传类型: {upload_type}")
+                with tempfile.NamedTemporaryFile(suffix=UPLOAD_SUFFIXES[upload_type], delete=False) as f:
+                    f.write(body)
+                    upload_path = f.name
+                # 上传时只使用上传的文件，忽略查询参数中的路径
+                options = {key: value for key, value in query.items() if key not in PATH_OPTIONS}
+                options[f"{upload_type}_path"] = upload_path
+
+            result = self._segment(options)
+            if options.get("format", "json") == "binary":
+                self._send(200, encode_seg_binary(result.labels, self.server.label_names),
+                           "application/octet-stream")
+            else:
+                probabilities = str(options.get("probabilities", "")).lower() in ("1", "true")
+                self._send_json(200, result_json(result, probabilities))
+        except (ValueError, KeyError, FileNotFoundError) as e:
+            self._send_json(400, {"error": str(e)})
+        except Exception as e:
+            self._send_json(500, {"error": str(e)})
+        finally:
+            if upload_path is not None:
+                os.remove(upload_path)
+            # 处理线程结束后不再使用，关闭它打开的特征缓存连接
+            self.server.service.close()
+
+    def _segment(self, options):
+        service = self.server.service
+        if options.get("bin_path"):
+            inputs, node_index, info = service.bin_inputs(options["bin_path"], options.get("step_path"))
+        elif options.get("step_path"):
+            inputs, node_index, info = service.step_inputs(options["step_path"])
+        else:
+            raise ValueError("需要step_path或bin_path")
+        return self.server.batcher.submit(inputs, node_index, info)
+
+    def _send_json(self, status, data):
+        self._send(status, json.dumps(data, ensure_ascii=False).encode("utf-8"), "application/json; charset=utf-8")
+
+    def _send(self, status, body, content_type):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+
+class InferenceServer(ThreadingHTTPServer):
+    """常驻的推理服务器，模型只加载一次，构图在请求线程中并发进行，推理由MicroBatcher合并"""
+
+    daemon_threads = True
+
+    def __init__(self, address, service, batcher, model_name="", label_names=None, verbose=False):
+        super().__init__(address, InferenceRequestHandler)
+        self.service = service
+        self.batcher = batcher
+        self.model_name = model_name
+        self.label_names = label_names or []
+        self.verbose = verbose
+
+
+def main():
+    from mesh_export import read_label_config
+
+    parser = argparse.ArgumentParser(description="本地分割推理服务器(模型常驻，动态合并请求)")
+    parser.add_argument("model", help="模型文件(.ckpt)")
+    parser.add_argument("--host", default=DEFAULT_HOST, help="监听地址")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT, help="监听端口")
+    parser.add_argument("--labels", help="标签配置文件，用于二进制结果中的标签配置哈希")
+    parser.add_argument("--batch-window-ms", type=float, default=DEFAULT_BATCH_WINDOW_MS,
+                        help="合并请求的等待时间(毫秒)")
+    parser.add_argument("--max-batch-nodes", type=int, default=DEFAULT_MAX_BATCH_NODES, help="每批的面数上限")
+    parser.add_argument("--verbose", action="store_true", help="打印每个请求")
+    args = parser.parse_args()
+
+    service = InferenceService.from_checkpoint(args.model)
+    label_names = read_label_config(args.labels)[0] if args.labels else None
+    batcher = MicroBatcher(service, args.batch_window_ms, args.max_batch_nodes)
+    server = InferenceServer((args.host, args.port), service, batcher, os.path.basename(args.model),
+                             label_names, args.verbose)
+    print(f"Serving {os.path.basename(args.model)} on http://{args.host}:{args.port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        batcher.stop()
+
+
+if __name__ == "__main__":
+    main()
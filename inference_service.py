@@ -0,0 +1,201 @@
+# inference_service.py
+import os
+import time
+import threading
+from dataclasses import dataclass, field
+from types import MappingProxyType
+import numpy as np
+import torch
+import dgl
+from OCC.Extend.DataExchange import read_step_file
+from preprocessor import load_one_graph, normalize_batch
+from graph_utils import build_graph, solid_instances, instance_node_index
+from graph_dataset import GraphShardDataset, is_graph_dataset
+from segmentation_model import Segmentation
+from feature_cache import FaceFeatureCache
+from constants import FEATURE_CACHE_PATH
+
+
+def _read_only(array):
+    array = np.asarray(array)
+    array.setflags(write=False)
+    return array
+
+
+@dataclass(frozen=True)
+class SegmentationResult:
+    """一次分割的结果，数组只读，可以在线程之间共享
+
+    labels/probabilities/logits按面的显示和导出顺序排列，
+    timings为各阶段耗时(秒)，instance_stats和feature_cache_stats只在从STEP构图时提供。
+    """
+    labels: np.ndarray
+    probabilities: np.ndarray
+    logits: np.ndarray
+    counts: tuple
+    timings: MappingProxyType = field(default_factory=lambda: MappingProxyType({}))
+    instance_stats: MappingProxyType = None
+    feature_cache_stats: MappingProxyType = None
+
+    @property
+    def face_count(self):
+        return len(self.labels)
+
+
+def prepare_inputs(graph):
+    """归一化后的图转换为模型输入的布局(通道在前)
+
+    返回与原图共享结构的新图(local_var)，不修改传入的图，同一个图可以多次分割。
+    """
+    inputs = graph.local_var()
+    inputs.ndata["x"] = graph.ndata["x"].permute(0, 3, 1, 2)
+    inputs.edata["x"] = graph.edata["x"].permute(0, 2, 1)
+    return inputs
+
+
+class InferenceService:
+    """可重入的分割推理服务，多个线程共享同一个eval模式的模型
+
+    服务本身不保存任何请求的状态：每次调用返回独立的SegmentationResult。
+    特征缓存(SQLite连接)按线程打开，图数据集读取器在锁内打开，分片的加载也由读取器加锁。
+    """
+
+    def __init__(self, model, feature_cache_path=FEATURE_CACHE_PATH):
+        self.model = model
+        self.model.eval()
+        self.num_classes = int(model.hparams.num_classes) if hasattr(model, "hparams") else None
+        self.feature_cache_path = feature_cache_path
+        self.local = threading.local()
+        self.lock = threading.Lock()
+        self.graph_datasets = {}
+
+    @classmethod
+    def from_checkpoint(cls, file_path, **kwargs):
+        return cls(Segmentation.load_from_checkpoint(file_path), **kwargs)
+
+    def feature_cache(self):
+        """当前线程的面特征缓存，无法打开时返回None"""
+        if self.feature_cache_path is None:
+            return None
+        cache = getattr(self.local, "feature_cache", None)
+        if cache is None:
+            try:
+                cache = FaceFeatureCache(self.feature_cache_path)
+            except Exception as e:
+                print(f"无法打开特征缓存: {str(e)}")
+                self.feature_cache_path = None
+                return None
+            self.local.feature_cache = cache
+        return cache
+
+    def graph_dataset(self, path):
+        with self.lock:
+            dataset = self.graph_datasets.get(path)
+            if dataset is None:
+                dataset = GraphShardDataset(path)
+                self.graph_datasets[path] = dataset
+            return dataset
+
+    def step_inputs(self, step_file=None, shape=None):
+        """从STEP构建模型输入，返回(输入图, 面到节点的索引, 附加信息)
+
+        重复引用的零件(相同TShape)只构图一次，实体外的面(单独的壳和面)合并为一个零件，
+        各零件的图合并为一个dgl.batch；面到节点的索引按面的显示顺序排列。
+        """
+        timings = {}
+        start = time.perf_counter()
+        if shape is None:
+            shape = read_step_file(step_file)
+            if not shape:
+                raise ValueError("无法读取STEP文件")
+        timings["read"] = time.perf_counter() - start
+
+        start = time.perf_counter()
+        prototypes, instance_ids, face_prototypes, face_nodes = solid_instances(shape)
+        if not prototypes:
+            raise ValueError("形状中没有面")
+        feature_cache = self.feature_cache()
+        if feature_cache is not None:
+            feature_cache.reset_stats()
+        graphs = [build_graph(prototype, 10, 10, 10, feature_cache=feature_cache) for prototype in prototypes]
+        inputs, _, _ = normalize_batch(dgl.batch(graphs))
+        node_index = instance_node_index([g.num_nodes() for g in graphs], face_prototypes, face_nodes)
+        timings["features"] = time.perf_counter() - start
+
+        info = {"timings": timings,
+                "instance_stats": {"solids": len(instance_ids), "unique": len(set(instance_ids.tolist()))},
+                "feature_cache_stats": feature_cache.stats() if feature_cache is not None else None}
+        return prepare_inputs(inputs), node_index, info
+
+    def bin_inputs(self, bin_file, step_file=None):
+        """从BIN文件或图数据集(按STEP文件名查找零件)读取模型输入"""
+        start = time.perf_counter()
+        if is_graph_dataset(bin_file):
+            # 特征保持数据集中的精度(float32/float16)，由模型在输入时转换
+            part_id = os.path.splitext(os.path.basename(step_file))[0] if step_file else None
+            if part_id is None:
+                raise ValueError("从图数据集读取时需要STEP文件名")
+            graph = self.graph_dataset(bin_file).get(part_id)["graph"]
+        else:
+            graph = load_one_graph(bin_file)["graph"]
+        return prepare_inputs(graph), None, {"timings": {"read": time.perf_counter() - start}}
+
+    def predict(self, inputs):
+        """模型前向，返回logits(节点数, 类别数)"""
+        with torch.no_grad():
+            return self.model(inputs)
+
+    def result(self, logits, node_index=None, info=None, timings=None):
+        """把logits转换为SegmentationResult，node_index把零件的节点展开到每个实体的面"""
+        info = info or {}
+        probabilities, predicted = torch.softmax(logits, dim=1).max(dim=1)
+        logits = logits.cpu().numpy()
+        predicted, probabilities = predicted.cpu().numpy(), probabilities.cpu().numpy()
+        if node_index is not None:
+            logits, predicted, probabilities = logits[node_index], predicted[node_index], probabilities[node_index]
+        minlength = self.num_classes or logits.shape[1]
+        timings = dict(info.get("timings", {}), **(timings or {}))
+        return SegmentationResult(
+            labels=_read_only(predicted),
+            probabilities=_read_only(probabilities),
+            logits=_read_only(logits),
+            counts=tuple(int(n) for n in np.bincount(predicted, minlength=minlength)),
+            timings=MappingProxyType(timings),
+            instance_stats=MappingProxyType(info["instance_stats"]) if info.get("instance_stats") else None,
+            feature_cache_stats=(MappingProxyType(info["feature_cache_stats"])
+                                 if info.get("feature_cache_stats") else None),
+        )
+
+    def run(self, inputs, node_index=None, info=None):
+        start = time.perf_counter()
+        logits = self.predict(inputs)
+        return self.result(logits, node_index, info, {"inference": time.perf_counter() - start})
+
+    def run_batch(self, prepared):
+        """把多个已构建的输入[(输入图, node_index, 附加信息)]合并为一个dgl.batch推理，返回对应的结果"""
+        start = time.perf_counter()
+        batch = prepared[0][0] if len(prepared) == 1 else dgl.batch([inputs for inputs, _, _ in prepared])
+        logits = self.predict(batch)
+        timings = {"inference": time.perf_counter() - start, "batch_size": len(prepared)}
+        chunks = torch.split(logits, [inputs.num_nodes() for inputs, _, _ in prepared])
+        return [self.result(chunk, node_index, info, timings)
+                for chunk, (_, node_index, info) in zip(chunks, prepared)]
+
+    def segment_step(self, step_file=None, shape=None):
+        """分割STEP文件(或已读取的形状)"""
+        return self.run(*self.step_inputs(step_file, shape))
+
+    def segment_bin(self, bin_file, step_file=None):
+        """分割BIN文件或图数据集中的零件"""
+        return self.run(*self.bin_inputs(bin_file, step_file))
+
+    def segment_graph(self, graph):
+        """分割已归一化的图(特征为[面, U, V, 通道]布局)"""
+        return self.run(prepare_inputs(graph))
+
+    def close(self):
+        """关闭当前线程的特征缓存"""
+        cache = getattr(self.local, "feature_cache", None)
+        if cache is not None:
+            cache.close()
+            self.local.feature_cache = None
@@ -0,0 +1,83 @@
+# label_store.py
+import numpy as np
+
+
+def smallest_label_dtype(max_label):
+    """能表示max_label的最小无符号整数类型"""
+    for dtype in (np.uint8, np.uint16, np.uint32):
+        if max_label <= np.iinfo(dtype).max:
+            return dtype
+    return np.uint64
+
+
+class LabelStore:
+    """紧凑的只读标签存储
+
+    标签以最小的无符号整数类型保存，对外只提供只读视图而不复制。
+    每次标签变化时version加一，界面缓存据此判断是否需要刷新。
+    """
+
+    def __init__(self):
+        self._labels = self._freeze(np.zeros(0, dtype=np.uint8))
+        self.num_classes = 0
+        self.counts = np.zeros(0, dtype=np.int64)
+        self.version = 0
+        self._face_index = None
+
+    @staticmethod
+    def _freeze(labels):
+        labels.flags.writeable = False
+        return labels
+
+    def set(self, labels, num_classes):
+        """保存标签，num_classes大于0时裁剪到[0, num_classes - 1]"""
+        labels = np.asarray(labels)
+        if labels.dtype.kind not in "iu":
+            labels = labels.astype(np.int64)
+
+        if labels.size:
+            min_label, max_label = int(labels.min()), int(labels.max())
+            if min_label < 0 or (num_classes > 0 and max_label >= num_classes):
+                upper = num_classes - 1 if num_classes > 0 else max_label
+                labels = np.clip(labels, 0, upper)
+                max_label = min(max_label, upper)
+        else:
+            max_label = 0
+
+        dtype = smallest_label_dtype(max(max_label, num_classes - 1, 0))
+        source = labels
+        labels = np.ascontiguousarray(labels, dtype=dtype)
+        if labels is source and labels.flags.writeable:
+            # 不冻结调用方仍可修改的数组
+            labels = labels.copy()
+        # 只读的外部数组(如memmap)直接使用其视图
+        labels = self._freeze(labels.view())
+
+        self._labels = labels
+        self.num_classes = num_classes
+        self.counts = np.bincount(labels, minlength=num_classes) if labels.size else np.zeros(num_classes, dtype=np.int64)
+        self.version += 1
+        self._face_index = None
+
+    def set_num_classes(self, num_classes):
+        """类别数改变时重新裁剪标签并更新统计"""
+        self.set(self._labels, num_classes)
+
+    def clear(self):
+        self.set(np.zeros(0, dtype=np.uint8), 0)
+
+    @property
+    def labels(self):
+        """只读标签视图"""
+        return self._labels
+
+    def face_index(self):
+        """按类别划分的面索引，标签变化后第一次访问时重建"""
+        if self._face_index is None:
+            order = np.argsort(self._labels, kind="stable")
+            bounds = np.searchsorted(self._labels[order], np.arange(self.num_classes + 1))
+            self._face_index = [order[bounds[i]:bounds[i + 1]] for i in range(self.num_classes)]
+        return self._face_index
+
+    def __len__(self):
+        return len(self._labels)
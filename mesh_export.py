@@ -0,0 +1,292 @@
+# mesh_export.py
+import os
+import json
+import struct
+import argparse
+from itertools import chain
+import numpy as np
+from OCC.Core.BRep import BRep_Tool
+from OCC.Core.TopAbs import TopAbs_REVERSED
+from OCC.Core.TopLoc import TopLoc_Location
+from OCC.Extend.DataExchange import read_step_file
+from shape_cache import CachedShape
+from seg_io import read_seg_file
+from constants import DEFAULT_COLORS, FINE_MESH_DEFLECTION
+
+MESH_FORMATS = (".ply", ".glb", ".obj")
+
+
+class FaceMesh:
+    """所有面的三角网格汇总成的扁平数组"""
+
+    def __init__(self, vertices, triangles, vertex_faces, triangle_faces, face_labels, colors):
+        self.vertices = vertices              # (N, 3) float32
+        self.triangles = triangles            # (M, 3) uint32
+        self.vertex_faces = vertex_faces      # (N,) 每个顶点所属的面索引
+        self.triangle_faces = triangle_faces  # (M,) 每个三角形所属的面索引
+        self.face_labels = face_labels        # (F,) 每个面的标签
+        self.colors = colors                  # (C, 3) uint8 类别颜色
+
+    def face_colors(self):
+        return self.colors[np.clip(self.face_labels, 0, len(self.colors) - 1)]
+
+
+def _triangulation_arrays(triangulation):
+    """三角剖分的节点(n, 3)和三角形(m, 3)(从1开始的索引)
+
+    坐标和索引作为一条扁平的序列由np.fromiter直接写入数组，不创建每个节点的列表。
+    """
+    num_nodes, num_triangles = triangulation.NbNodes(), triangulation.NbTriangles()
+    nodes = np.fromiter(chain.from_iterable(triangulation.Node(i).Coord() for i in range(1, num_nodes + 1)),
+                        dtype=np.float64, count=3 * num_nodes).reshape(num_nodes, 3)
+    triangles = np.fromiter(chain.from_iterable(triangulation.Triangle(i).Get()
+                                                for i in range(1, num_triangles + 1)),
+                            dtype=np.int64, count=3 * num_triangles).reshape(num_triangles, 3)
+    return nodes, triangles
+
+
+def collect_face_meshes(faces, labels, colors):
+    """一次遍历收集所有面的三角网格，面需要已经剖分，标签不能为负"""
+    face_labels = np.asarray(labels[:len(faces)], dtype=np.int64)
+    if face_labels.size and face_labels.min() < 0:
+        raise ValueError("标签不能为负数")
+    vertex_blocks = []
+    triangle_blocks = []
+    vertex_counts = np.zeros(len(faces), dtype=np.int64)
+    triangle_counts = np.zeros(len(faces), dtype=np.int64)
+    offset = 0
+
+    for face_index, face in enumerate(faces):
+        location = TopLoc_Location()
+        triangulation = BRep_Tool.Triangulation(face, location)
+        if triangulation is None or triangulation.NbTriangles() == 0:
+            continue
+
+        nodes, triangles = _triangulation_arrays(triangulation)
+        if not location.IsIdentity():
+            trsf = location.Transformation()
+            matrix = np.array([[trsf.Value(r, c) for c in range(1, 5)] for r in range(1, 4)])
+            nodes = nodes @ matrix[:, :3].T + matrix[:, 3]
+
+        if face.Orientation() == TopAbs_REVERSED:
+            triangles = triangles[:, [0, 2, 1]]
+
+        vertex_blocks.append(nodes)
+        triangle_blocks.append(triangles - 1 + offset)
+        vertex_counts[face_index] = len(nodes)
+        triangle_counts[face_index] = len(triangles)
+        offset += len(nodes)
+
+    face_ids = np.arange(len(faces), dtype=np.uint32)
+    if vertex_blocks:
+        vertices = np.concatenate(vertex_blocks).astype(np.float32)
+        triangles = np.concatenate(triangle_blocks).astype(np.uint32)
+    else:
+        vertices = np.zeros((0, 3), dtype=np.float32)
+        triangles = np.zeros((0, 3), dtype=np.uint32)
+
+    return FaceMesh(
+        vertices=vertices,
+        triangles=triangles,
+        vertex_faces=np.repeat(face_ids, vertex_counts),
+        triangle_faces=np.repeat(face_ids, triangle_counts),
+        face_labels=face_labels,
+        colors=np.clip(np.asarray(colors, dtype=np.int64), 0, 255).astype(np.uint8),
+    )
+
+
+def write_ply(file_path, mesh):
+    """二进制PLY，每个三角形带颜色、面索引和标签"""
+    header = (
+        "ply\n"
+        "format binary_little_endian 1.0\n"
+        f"element vertex {len(mesh.vertices)}\n"
+        "property float x\nproperty float y\nproperty float z\n"
+        f"element face {len(mesh.triangles)}\n"
+        "property list uchar int vertex_indices\n"
+        "property uchar red\nproperty uchar green\nproperty uchar blue\n"
+        "property int face_id\n"
+        "property int label\n"
+        "end_header\n"
+    )
+    face_dtype = np.dtype([
+        ("count", "u1"), ("indices", "<i4", (3,)), ("rgb", "u1", (3,)),
+        ("face_id", "<i4"), ("label", "<i4"),
+    ])
+    faces = np.empty(len(mesh.triangles), dtype=face_dtype)
+    faces["count"] = 3
+    faces["indices"] = mesh.triangles
+    faces["rgb"] = mesh.face_colors()[mesh.triangle_faces]
+    faces["face_id"] = mesh.triangle_faces
+    faces["label"] = mesh.face_labels[mesh.triangle_faces]
+
+    with open(file_path, "wb") as f:
+        f.write(header.encode("ascii"))
+        f.write(mesh.vertices.astype("<f4").tobytes())
+        f.write(faces.tobytes())
+
+
+def write_obj(file_path, mesh):
+    """OBJ，顶点颜色表示标签颜色，每个面一个分组(g face_<索引>)"""
+    vertex_colors = mesh.face_colors()[mesh.vertex_faces] / 255.0
+    with open(file_path, "w", encoding="utf-8") as f:
+        f.write(f"# faces: {len(mesh.face_labels)}\n")
+        np.savetxt(f, np.hstack([mesh.vertices, vertex_colors]),
+                   fmt="v %.6f %.6f %.6f %.4f %.4f %.4f")
+
+        if len(mesh.triangles) == 0:
+            return
+        indices = (mesh.triangles.astype(np.int64) + 1).astype(str)
+        lines = np.char.add("f ", indices[:, 0])
+        lines = np.char.add(np.char.add(lines, " "), indices[:, 1])
+        lines = np.char.add(np.char.add(lines, " "), indices[:, 2])
+
+        # 每个面的第一个三角形前插入分组
+        starts = np.flatnonzero(np.r_[True, mesh.triangle_faces[1:] != mesh.triangle_faces[:-1]])
+        groups = np.char.add("g face_", mesh.triangle_faces[starts].astype(str))
+        lines = np.insert(lines.astype(object), starts, groups.astype(object))
+        f.write("\n".join(lines.tolist()))
+        f.write("\n")
+
+
+def write_glb(file_path, mesh, label_names=None):
+    """二进制glTF，带顶点颜色(COLOR_0)以及_FACE_ID和_LABEL属性
+
+    glTF的访问器不能为空，没有三角形的网格无法导出。
+    """
+    if len(mesh.triangles) == 0 or len(mesh.vertices) == 0:
+        raise ValueError("网格没有三角形，无法导出glTF")
+    vertex_colors = np.full((len(mesh.vertices), 4), 255, dtype=np.uint8)
+    vertex_colors[:, :3] = mesh.face_colors()[mesh.vertex_faces]
+    arrays = [
+        (mesh.vertices.astype("<f4"), 5126, "VEC3", 34962, False),
+        (vertex_colors, 5121, "VEC4", 34962, True),
+        (mesh.vertex_faces.astype("<f4"), 5126, "SCALAR", 34962, False),
+        (mesh.face_labels[mesh.vertex_faces].astype("<f4"), 5126, "SCALAR", 34962, False),
+        (mesh.triangles.reshape(-1).astype("<u4"), 5125, "SCALAR", 34963, False),
+    ]
+
+    buffer_views = []
+    accessors = []
+    chunks = []
+    offset = 0
+    for data, component_type, accessor_type, target, normalized in arrays:
+        raw = data.tobytes()
+        buffer_views.append({"buffer": 0, "byteOffset": offset, "byteLength": len(raw), "target": target})
+        accessor = {
+            "bufferView": len(buffer_views) - 1,
+            "componentType": component_type,
+            "count": len(data),
+            "type": accessor_type,
+        }
+        if normalized:
+            accessor["normalized"] = True
+        accessors.append(accessor)
+        padding = (-len(raw)) % 4
+        chunks.append(raw + b"\x00" * padding)
+        offset += len(raw) + padding
+
+    accessors[0]["min"] = mesh.vertices.min(axis=0).tolist()
+    accessors[0]["max"] = mesh.vertices.max(axis=0).tolist()
+
+    gltf = {
+        "asset": {"version": "2.0", "generator": "3D CAD Segmentation"},
+        "scene": 0,
+        "scenes": [{"nodes": [0]}],
+        "nodes": [{"mesh": 0}],
+        "meshes": [{
+            "primitives": [{
+                "attributes": {"POSITION": 0, "COLOR_0": 1, "_FACE_ID": 2, "_LABEL": 3},
+                "indices": 4,
+                "mode": 4,
+            }],
+            "extras": {
+                "label_names": list(label_names) if label_names else [],
+                "label_colors": mesh.colors.tolist(),
+            },
+        }],
+        "buffers": [{"byteLength": offset}],
+        "bufferViews": buffer_views,
+        "accessors": accessors,
+    }
+
+    json_chunk = json.dumps(gltf, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+    json_chunk += b" " * ((-len(json_chunk)) % 4)
+    bin_chunk = b"".join(chunks)
+    total_length = 12 + 8 + len(json_chunk) + 8 + len(bin_chunk)
+
+    with open(file_path, "wb") as f:
+        f.write(struct.pack("<4sII", b"glTF", 2, total_length))
+        f.write(struct.pack("<I4s", len(json_chunk), b"JSON"))
+        f.write(json_chunk)
+        f.write(struct.pack("<I4s", len(bin_chunk), b"BIN\x00"))
+        f.write(bin_chunk)
+
+
+def write_mesh(file_path, mesh, label_names=None):
+    """按扩展名写出网格文件"""
+    ext = os.path.splitext(file_path)[1].lower()
+    if ext == ".ply":
+        write_ply(file_path, mesh)
+    elif ext == ".obj":
+        write_obj(file_path, mesh)
+    elif ext == ".glb":
+        write_glb(file_path, mesh, label_names)
+    else:
+        raise ValueError(f"不支持的网格格式: {ext}")
+
+
+def export_colored_mesh(step_file, labels, colors, output_file, label_names=None,
+                        cached_shape=None, relative_deflection=FINE_MESH_DEFLECTION):
+    """剖分STEP文件并导出带标签颜色的网格，可直接传入已缓存(已剖分)的形状"""
+    if cached_shape is None:
+        shape = read_step_file(step_file)
+        if not shape:
+            raise ValueError("无法读取STEP文件")
+        cached_shape = CachedShape(step_file, shape)
+    cached_shape.mesh(relative_deflection)
+
+    mesh = collect_face_meshes(cached_shape.faces[:len(labels)], labels, colors)
+    write_mesh(output_file, mesh, label_names)
+    return mesh
+
+
+def read_label_config(file_path):
+    """读取标签配置文件中的类别名称和颜色"""
+    with open(file_path, 'r', encoding='utf-8') as f:
+        mapping = json.load(f)
+
+    if isinstance(mapping, dict) and "label_names" in mapping:
+        return mapping["label_names"], mapping["colors"]
+    if isinstance(mapping, dict):
+        sorted_items = sorted(mapping.items(), key=lambda x: int(x[0]))
+        names = [name for key, name in sorted_items]
+        return names, [DEFAULT_COLORS[int(key) % len(DEFAULT_COLORS)] for key, name in sorted_items]
+    return mapping, [DEFAULT_COLORS[i % len(DEFAULT_COLORS)] for i in range(len(mapping))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="导出带分割标签颜色的网格(PLY/glTF/OBJ)")
+    parser.add_argument("step_file", help="STEP文件")
+    parser.add_argument("seg_file", help="SEG标签文件(文本或二进制)")
+    parser.add_argument("-o", "--output", help="输出文件(.ply/.glb/.obj)，默认与STEP文件同名的.ply")
+    parser.add_argument("--labels", help="标签配置JSON文件，用于类别颜色")
+    parser.add_argument("--deflection", type=float, default=FINE_MESH_DEFLECTION,
+                        help="相对于包围盒对角线的弦高误差")
+    args = parser.parse_args()
+
+    labels, _ = read_seg_file(args.seg_file)
+
+    if args.labels:
+        label_names, colors = read_label_config(args.labels)
+    else:
+        label_names, colors = None, DEFAULT_COLORS
+
+    output = args.output or os.path.splitext(args.step_file)[0] + ".ply"
+    mesh = export_colored_mesh(args.step_file, labels, colors, output, label_names,
+                               relative_deflection=args.deflection)
+    print(f"{output}: {len(mesh.face_labels)} faces, {len(mesh.triangles)} triangles")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,14 +1,10 @@
 # preprocessor.py
 import torch
+import dgl
 from pathlib import Path
-from torch import FloatTensor
 
 def bounding_box_pointcloud(pts: torch.Tensor):
-    x = pts[:, 0]
-    y = pts[:, 1]
-    z = pts[:, 2]
-    box = [[x.min(), y.min(), z.min()], [x.max(), y.max(), z.max()]]
-    return torch.tensor(box)
+    return torch.stack([pts.amin(dim=0), pts.amax(dim=0)])
 
 def bounding_box_uvgrid(inp: torch.Tensor):
     pts = inp[..., :3].reshape((-1, 3))
@@ -28,19 +24,59 @@ def center_and_scale_uvgrid(inp: torch.Tensor, return_center_scale=False):
         return inp, center, scale
     return inp
 
+def _as_float32(x: torch.Tensor):
+    # Modify float32 features in place, convert other dtypes once
+    return x if x.dtype == torch.float32 else x.float()
+
+def normalize_batch(graph):
+    """Center and scale every graph of a dgl.batch to [-1, 1] in one pass (in place, float32)"""
+    node_x = _as_float32(graph.ndata["x"])
+    edge_x = _as_float32(graph.edata["x"])
+    num_nodes = graph.batch_num_nodes()
+    num_edges = graph.batch_num_edges()
+
+    # Per-face bounding box of the samples inside the trimmed region
+    pts = node_x[..., :3].reshape(node_x.shape[0], -1, 3)
+    inside = (node_x[..., 6].reshape(node_x.shape[0], -1) == 1).unsqueeze(-1)
+    face_min = torch.where(inside, pts, torch.full_like(pts, float("inf"))).amin(dim=1)
+    face_max = torch.where(inside, pts, torch.full_like(pts, float("-inf"))).amax(dim=1)
+
+    # Reduce per-face boxes to one box per graph
+    box_min = dgl.ops.segment_reduce(num_nodes, face_min, "min")
+    box_max = dgl.ops.segment_reduce(num_nodes, face_max, "max")
+    center = 0.5 * (box_min + box_max)
+    scale = 2.0 / (box_max - box_min).amax(dim=1)
+    # Leave graphs without any valid samples unchanged
+    valid = torch.isfinite(center).all(dim=1) & torch.isfinite(scale)
+    center = torch.where(valid.unsqueeze(1), center, torch.zeros_like(center))
+    scale = torch.where(valid, scale, torch.ones_like(scale))
+
+    node_center = torch.repeat_interleave(center, num_nodes, dim=0)
+    node_scale = torch.repeat_interleave(scale, num_nodes)
+    node_x[..., :3] -= node_center.view(-1, *([1] * (node_x.dim() - 2)), 3)
+    node_x[..., :3] *= node_scale.view(-1, *([1] * (node_x.dim() - 1)))
+    if edge_x.shape[0]:
+        edge_center = torch.repeat_interleave(center, num_edges, dim=0)
+        edge_scale = torch.repeat_interleave(scale, num_edges)
+        edge_x[..., :3] -= edge_center.view(-1, *([1] * (edge_x.dim() - 2)), 3)
+        edge_x[..., :3] *= edge_scale.view(-1, *([1] * (edge_x.dim() - 1)))
+
+    graph.ndata["x"] = node_x
+    graph.edata["x"] = edge_x
+    return graph, center, scale
+
+def normalize_graph(graph):
+    return normalize_batch(graph)[0]
+
 def load_one_graph(file_path):
     from dgl.data.utils import load_graphs
     file_path = Path(file_path)
     graph = load_graphs(str(file_path))[0][0]
-    sample = {"graph": graph, "filename": file_path.stem}
-
-    sample["graph"].ndata["x"], center, scale = center_and_scale_uvgrid(
-        sample["graph"].ndata["x"], return_center_scale=True
-    )
+    return {"graph": normalize_graph(graph), "filename": file_path.stem}
 
-    sample["graph"].edata["x"][..., :3] -= center
-    sample["graph"].edata["x"][..., :3] *= scale
-    sample["graph"].ndata["x"] = sample["graph"].ndata["x"].type(FloatTensor)
-    sample["graph"].edata["x"] = sample["graph"].edata["x"].type(FloatTensor)
-
-    return sample
\ No newline at end of file
+def load_graph_batch(file_paths):
+    """Load many BIN files as one normalized dgl.batch"""
+    from dgl.data.utils import load_graphs
+    graphs = [load_graphs(str(file_path))[0][0] for file_path in file_paths]
+    batch, _, _ = normalize_batch(dgl.batch(graphs))
+    return batch
\ No newline at end of file
@@ -0,0 +1,88 @@
+# scene_cache.py
+from collections import OrderedDict
+from OCC.Core.BRep import BRep_Tool
+from OCC.Core.TopLoc import TopLoc_Location
+from constants import SCENE_CACHE_SIZE, SCENE_CACHE_BUDGET_MB
+
+# 每个AIS对象及其显示结构的大致固定开销(字节)
+AIS_OVERHEAD_BYTES = 2048
+
+
+def estimate_scene_bytes(faces, labels):
+    """按三角网格大小估算场景占用的内存
+
+    三角网格本身(节点3个double，三角形3个int)，加上显示用的
+    非索引顶点数组(每个三角形3个顶点，位置和法向各3个float)。
+    """
+    total = labels.nbytes + len(faces) * AIS_OVERHEAD_BYTES
+    location = TopLoc_Location()
+    for face in faces:
+        triangulation = BRep_Tool.Triangulation(face, location)
+        if triangulation is None:
+            continue
+        total += triangulation.NbNodes() * 24 + triangulation.NbTriangles() * (12 + 72)
+    return total
+
+
+class Scene:
+    """已显示过的分割场景，AIS对象从视图中擦除但保留在上下文中"""
+
+    def __init__(self, key, cached_shape, face_shapes, face_index_map, ais_list, labels,
+                 palette, category_visible, face_focus_active):
+        self.key = key
+        self.cached_shape = cached_shape
+        self.face_shapes = face_shapes
+        self.face_index_map = face_index_map
+        self.ais_list = ais_list
+        self.labels = labels
+        # 擦除时面的着色状态，恢复时据此判断需要重新着色的类别
+        self.palette = palette
+        self.category_visible = category_visible
+        self.face_focus_active = face_focus_active
+        self.memory = estimate_scene_bytes(face_shapes, labels)
+
+
+class SceneCache:
+    """最近显示的场景(LRU)，按数量和内存预算淘汰"""
+
+    def __init__(self, max_size=SCENE_CACHE_SIZE, budget_bytes=SCENE_CACHE_BUDGET_MB * 1024 * 1024):
+        self.max_size = max_size
+        self.budget_bytes = budget_bytes
+        self.scenes = OrderedDict()
+        self.total_bytes = 0
+
+    def put(self, scene):
+        """保存场景，返回被淘汰的场景，调用方负责从上下文中移除它们的AIS对象"""
+        evicted = []
+        old = self.scenes.pop(scene.key, None)
+        if old is not None:
+            self.total_bytes -= old.memory
+            evicted.append(old)
+
+        self.scenes[scene.key] = scene
+        self.total_bytes += scene.memory
+        while self.scenes and (len(self.scenes) > self.max_size or self.total_bytes > self.budget_bytes):
+            _, oldest = self.scenes.popitem(last=False)
+            self.total_bytes -= oldest.memory
+            evicted.append(oldest)
+        return evicted
+
+    def pop(self, key):
+        """取出场景(场景重新显示后不再属于缓存)，不存在时返回None"""
+        scene = self.scenes.pop(key, None)
+        if scene is not None:
+            self.total_bytes -= scene.memory
+        return scene
+
+    def clear(self):
+        """清空缓存，返回所有场景"""
+        scenes = list(self.scenes.values())
+        self.scenes.clear()
+        self.total_bytes = 0
+        return scenes
+
+    def __contains__(self, key):
+        return key in self.scenes
+
+    def __len__(self):
+        return len(self.scenes)
@@ -0,0 +1,188 @@
+# seg_io.py
+import json
+import struct
+import hashlib
+import warnings
+import numpy as np
+from label_store import smallest_label_dtype
+
+SEG_BINARY_MAGIC = b"SEGB"
+SEG_BINARY_VERSION = 1
+# 二进制SEG文件头: 魔数, 版本, dtype代码, 保留, 面数, 标签配置哈希
+SEG_BINARY_HEADER = struct.Struct("<4sBBxxQ16s")
+SEG_DTYPE_CODES = {1: np.uint8, 2: np.uint16, 3: np.uint32, 4: np.uint64}
+
+
+def label_config_hash(label_names):
+    """标签配置哈希，用于检查SEG文件与当前标签配置是否一致"""
+    data = json.dumps(list(label_names), ensure_ascii=False).encode("utf-8")
+    return hashlib.blake2b(data, digest_size=16).digest()
+
+
+def is_binary_seg(file_path):
+    with open(file_path, 'rb') as f:
+        return f.read(len(SEG_BINARY_MAGIC)) == SEG_BINARY_MAGIC
+
+
+def parse_seg_text(data):
+    """解析文本SEG内容，标签之间可以用换行或任意空白分隔"""
+    # 只有空白时np.fromstring会返回[0]，空内容直接返回空数组
+    if not data.split():
+        return np.zeros(0, dtype=np.int64)
+    with warnings.catch_warnings():
+        # 旧版NumPy遇到无效数据时只给出DeprecationWarning
+        warnings.simplefilter("error", DeprecationWarning)
+        try:
+            return np.fromstring(data, dtype=np.int64, sep=" ")
+        except (ValueError, DeprecationWarning):
+            raise ValueError("SEG文件包含无效的标签数据")
+
+
+def read_seg_text(file_path):
+    with open(file_path, 'rb') as f:
+        return parse_seg_text(f.read())
+
+
+def read_seg_binary(file_path):
+    """以内存映射方式读取二进制SEG文件，返回(标签, 标签配置哈希)"""
+    with open(file_path, 'rb') as f:
+        header = f.read(SEG_BINARY_HEADER.size)
+    if len(header) < SEG_BINARY_HEADER.size:
+        raise ValueError("二进制SEG文件头不完整")
+
+    magic, version, dtype_code, count, config_hash = SEG_BINARY_HEADER.unpack(header)
+    if magic != SEG_BINARY_MAGIC or version != SEG_BINARY_VERSION:
+        raise ValueError("不支持的二进制SEG文件版本")
+    if dtype_code not in SEG_DTYPE_CODES:
+        raise ValueError("二进制SEG文件的标签类型无效")
+
+    dtype = np.dtype(SEG_DTYPE_CODES[dtype_code]).newbyteorder("<")
+    if count == 0:
+        return np.zeros(0, dtype=dtype), config_hash
+    labels = np.memmap(file_path, dtype=dtype, mode='r', offset=SEG_BINARY_HEADER.size, shape=(count,))
+    return labels, config_hash
+
+
+def read_seg_file(file_path):
+    """自动识别文本或二进制SEG文件，返回(标签, 标签配置哈希)，文本格式没有哈希"""
+    if is_binary_seg(file_path):
+        return read_seg_binary(file_path)
+    return read_seg_text(file_path), None
+
+
+def write_seg_text(file_path, labels, chunk_size=1 << 16):
+    """每行一个标签的文本SEG文件"""
+    labels = np.asarray(labels)
+    with open(file_path, 'w', encoding='utf-8') as f:
+        for start in range(0, len(labels), chunk_size):
+            f.write("\n".join(map(str, labels[start:start + chunk_size].tolist())))
+            f.write("\n")
+
+
+def encode_seg_binary(labels, label_names):
+    """二进制SEG格式的字节(文件头+标签)，标签以最小的无符号整数类型保存"""
+    labels = np.asarray(labels)
+    max_label = int(labels.max()) if labels.size else 0
+    dtype = np.dtype(smallest_label_dtype(max_label))
+    dtype_code = next(code for code, value in SEG_DTYPE_CODES.items() if np.dtype(value) == dtype)
+
+    header = SEG_BINARY_HEADER.pack(SEG_BINARY_MAGIC, SEG_BINARY_VERSION, dtype_code,
+                                    len(labels), label_config_hash(label_names))
+    return header + labels.astype(dtype.newbyteorder("<"), copy=False).tobytes()
+
+
+def decode_seg_binary(data):
+    """解析二进制SEG格式的字节，返回(标签, 标签配置哈希)"""
+    if len(data) < SEG_BINARY_HEADER.size:
+        raise ValueError("二进制SEG数据头不完整")
+    magic, version, dtype_code, count, config_hash = SEG_BINARY_HEADER.unpack_from(data)
+    if magic != SEG_BINARY_MAGIC or version != SEG_BINARY_VERSION:
+        raise ValueError("不支持的二进制SEG文件版本")
+    if dtype_code not in SEG_DTYPE_CODES:
+        raise ValueError("二进制SEG文件的标签类型无效")
+    dtype = np.dtype(SEG_DTYPE_CODES[dtype_code]).newbyteorder("<")
+    return np.frombuffer(data, dtype=dtype, count=count, offset=SEG_BINARY_HEADER.size), config_hash
+
+
+def write_seg_binary(file_path, labels, label_names):
+    """带文件头的二进制SEG文件，标签以最小的无符号整数类型保存"""
+    with open(file_path, 'wb') as f:
+        f.write(encode_seg_binary(labels, label_names))
+
+
+def write_seg_file(file_path, labels, label_names=None):
+    """按扩展名写出SEG文件，.segb为二进制格式"""
+    if file_path.lower().endswith(".segb"):
+        write_seg_binary(file_path, labels, label_names or [])
+    else:
+        write_seg_text(file_path, labels)
+
+
+def run_length_encode(labels):
+    """游程编码，返回(值, 长度)"""
+    labels = np.asarray(labels)
+    if labels.size == 0:
+        return labels[:0], np.zeros(0, dtype=np.int64)
+    starts = np.flatnonzero(np.r_[True, labels[1:] != labels[:-1]])
+    return labels[starts], np.diff(np.r_[starts, labels.size])
+
+
+def run_length_decode(values, lengths):
+    return np.repeat(np.asarray(values), np.asarray(lengths, dtype=np.int64))
+
+
+def _write_json_array(f, values, chunk_size):
+    """分块写出整数数组，不构造完整的Python列表"""
+    values = np.asarray(values)
+    f.write("[")
+    for start in range(0, len(values), chunk_size):
+        if start:
+            f.write(",")
+        f.write(",".join(map(str, values[start:start + chunk_size].tolist())))
+    f.write("]")
+
+
+def write_results_json(file_path, metadata, labels, run_length=False, chunk_size=1 << 16):
+    """流式写出分割结果JSON
+
+    metadata中的字段按原样写出，标签写成单行紧凑数组(face_labels)，
+    或游程编码(face_labels_rle)，label_encoding字段标明所用格式。
+    """
+    with open(file_path, 'w', encoding='utf-8') as f:
+        f.write("{\n")
+        for key, value in metadata.items():
+            f.write(f"    {json.dumps(key)}: {json.dumps(value, ensure_ascii=False)},\n")
+
+        if run_length:
+            values, lengths = run_length_encode(labels)
+            f.write('    "label_encoding": "rle",\n')
+            f.write('    "face_labels_rle": {"values": ')
+            _write_json_array(f, values, chunk_size)
+            f.write(', "lengths": ')
+            _write_json_array(f, lengths, chunk_size)
+            f.write("}\n")
+        else:
+            f.write('    "label_encoding": "array",\n')
+            f.write('    "face_labels": ')
+            _write_json_array(f, labels, chunk_size)
+            f.write("\n")
+        f.write("}\n")
+
+
+def read_results_labels(results):
+    """从导出的结果JSON(已解析的字典)中取出标签数组"""
+    if "face_labels_rle" in results:
+        rle = results["face_labels_rle"]
+        return run_length_decode(rle["values"], rle["lengths"])
+    return np.asarray(results.get("face_labels", []), dtype=np.int64)
+
+
+def write_results_npz(file_path, metadata, labels, label_names, label_colors):
+    """压缩NPZ格式的分割结果，标签保持原有的紧凑类型"""
+    np.savez_compressed(
+        file_path,
+        face_labels=np.asarray(labels),
+        label_names=np.asarray(list(label_names), dtype=str),
+        label_colors=np.asarray(label_colors, dtype=np.uint8).reshape(-1, 3),
+        metadata=np.asarray(json.dumps(metadata, ensure_ascii=False)),
+    )
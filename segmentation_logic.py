@@ -1,31 +1,72 @@
 # segmentation_logic.py
 import os
 import json
-import tempfile
-import torch
-import numpy as np
-import dgl
-from occwl.io import load_step
-from preprocessor import load_one_graph
-from graph_utils import build_graph
 from constants import DEFAULT_COLORS
-from segmentation_model import Segmentation
+from label_store import LabelStore
+from seg_io import read_seg_file, label_config_hash
+from inference_service import InferenceService
 
 
 class SegmentationLogic:
+    """界面使用的有状态封装：保存当前标签和配置，推理交给无状态的InferenceService"""
+
     def __init__(self):
-        self.model = None
+        self.service = None
         self.label_mapping = None
         self.label_names = ["类别 1", "类别 2"]
         self.colors = [DEFAULT_COLORS[0].copy(), DEFAULT_COLORS[1].copy()]
-        self.predicted_labels = []
-        self.face_count = 0
-        self.label_counts = [0] * len(self.label_names)
+        self.label_store = LabelStore()
+        self.face_probabilities = None
+        # 最近一次分割的完整结果(SegmentationResult)
+        self.last_result = None
+
+    @property
+    def model(self):
+        return self.service.model if self.service is not None else None
+
+    @property
+    def feature_cache_stats(self):
+        """最近一次模式1处理的特征缓存命中统计"""
+        return self.last_result.feature_cache_stats if self.last_result is not None else None
+
+    @property
+    def instance_stats(self):
+        """最近一次模式1处理的实体数和唯一零件数"""
+        return self.last_result.instance_stats if self.last_result is not None else None
+
+    @property
+    def predicted_labels(self):
+        """只读的预测标签视图"""
+        return self.label_store.labels
+
+    @property
+    def face_count(self):
+        return len(self.label_store)
+
+    @property
+    def label_counts(self):
+        counts = self.label_store.counts
+        return [int(counts[i]) if i < len(counts) else 0 for i in range(len(self.label_names))]
+
+    @property
+    def label_face_index(self):
+        """按类别划分的面索引，类别切换时只需处理该类别的面"""
+        return self.label_store.face_index()
+
+    @property
+    def label_version(self):
+        """标签版本号，标签变化时递增"""
+        return self.label_store.version
+
+    def set_predicted_labels(self, labels, probabilities=None):
+        """保存预测标签，裁剪到有效范围并更新统计"""
+        self.label_store.set(labels, len(self.colors))
+        self.face_probabilities = probabilities
 
     def load_model(self, file_path):
         """加载模型文件"""
-        self.model = Segmentation.load_from_checkpoint(file_path)
-        self.model.eval()
+        self.close()
+        self.service = InferenceService.from_checkpoint(file_path)
         return os.path.basename(file_path)
 
     def load_labels(self, file_path):
@@ -54,99 +95,81 @@ class SegmentationLogic:
             needed = len(self.label_names) - len(self.colors)
             self.colors.extend(DEFAULT_COLORS[:needed])
 
-        # 重置计数
-        self.label_counts = [0] * len(self.label_names)
+        # 按新的类别数重新裁剪标签和计数
+        if len(self.label_store):
+            self.label_store.set_num_classes(len(self.colors))
         return os.path.basename(file_path)
 
     def update_label_config(self, config):
         """更新标签配置"""
         self.label_names = config["label_names"]
         self.colors = [color.copy() for color in config["colors"]]
-        self.label_counts = [0] * len(self.label_names)
 
         # 如果已有预测结果，需要调整标签范围
-        if len(self.predicted_labels) > 0:
-            max_label = len(self.colors) - 1
-            if max_label >= 0:
-                self.predicted_labels = np.clip(self.predicted_labels, 0, max_label)
-                # 重新计算标签计数
-                unique, counts = np.unique(self.predicted_labels, return_counts=True)
-                self.label_counts = [0] * len(self.label_names)
-                for u, c in zip(unique, counts):
-                    if u < len(self.label_counts):
-                        self.label_counts[u] = c
-
-    def process_step_file(self, step_file, mode, bin_file=None):
-        """处理STEP文件进行分割"""
+        if len(self.label_store):
+            self.label_store.set_num_classes(len(self.colors))
+
+    def process_step_file(self, step_file, mode, bin_file=None, shape=None):
+        """处理STEP文件进行分割，shape为已读取的形状(可选，避免重复解析)"""
+        self.last_result = None
         if mode == 2 and bin_file:
-            sample = load_one_graph(bin_file)
-            inputs = sample["graph"]
-            inputs.ndata["x"] = inputs.ndata["x"].permute(0, 3, 1, 2)
-            inputs.edata["x"] = inputs.edata["x"].permute(0, 2, 1)
+            result = self.service.segment_bin(bin_file, step_file)
         elif mode == 1:
-            solid = load_step(step_file)[0]
-            graph = build_graph(solid, 10, 10, 10)
-
-            with tempfile.TemporaryDirectory() as temp_dir:
-                temp_bin = os.path.join(temp_dir, "temp_graph.bin")
-                dgl.data.utils.save_graphs(temp_bin, [graph])
-
-                sample = load_one_graph(temp_bin)
-                inputs = sample["graph"]
-                inputs.ndata["x"] = inputs.ndata["x"].permute(0, 3, 1, 2)
-                inputs.edata["x"] = inputs.edata["x"].permute(0, 2, 1)
+            result = self.service.segment_step(step_file, shape)
         else:
             raise ValueError("无效的分割模式")
 
-        with torch.no_grad():
-            logits = self.model(inputs)
-            predicted = torch.argmax(logits, dim=1).cpu().numpy()
-            max_label = len(self.colors) - 1
-            self.predicted_labels = np.clip(predicted, 0, max_label)
-
-        # 更新统计信息
-        unique, counts = np.unique(self.predicted_labels, return_counts=True)
-        self.face_count = len(self.predicted_labels)
-        self.label_counts = [0] * len(self.label_names)
-        for u, c in zip(unique, counts):
-            if u < len(self.label_counts):
-                self.label_counts[u] = c
-
+        self.apply_result(result)
         return self.predicted_labels
 
+    def prepare_step_inputs(self, step_file, shape=None):
+        """读取一个STEP文件(模式1)并构图，返回的输入由run_step_batch合并推理"""
+        return self.service.step_inputs(step_file, shape)
+
+    def run_step_batch(self, prepared):
+        """把多个prepare_step_inputs的结果合并为一批推理
+
+        prepared中可以包含构图时的异常，返回与之对应的SegmentationResult或异常。
+        结果不会设置为当前标签，由调用方逐个apply_result。
+        """
+        outcomes = list(prepared)
+        indices = [i for i, item in enumerate(prepared) if not isinstance(item, Exception)]
+        inputs = [prepared[i] for i in indices]
+        if inputs:
+            try:
+                results = self.service.run_batch(inputs)
+            except Exception:
+                # 合并推理失败时逐个推理，只让出错的文件失败
+                results = []
+                for item in inputs:
+                    try:
+                        results.append(self.service.run(*item))
+                    except Exception as e:
+                        results.append(e)
+            for i, result in zip(indices, results):
+                outcomes[i] = result
+        return outcomes
+
+    def apply_result(self, result):
+        """把分割结果设置为当前标签"""
+        self.last_result = result
+        self.set_predicted_labels(result.labels, result.probabilities)
+
+    def close(self):
+        if self.service is not None:
+            self.service.close()
+
     def load_seg_file(self, file_path):
-        """加载SEG分割结果文件"""
-        with open(file_path, 'r', encoding='utf-8') as f:
-            lines = f.readlines()
-            self.predicted_labels = []
+        """加载SEG分割结果文件(文本或二进制格式)"""
+        labels, config_hash = read_seg_file(file_path)
 
-            for line in lines:
-                line = line.strip()
-                if line:
-                    try:
-                        label = int(line)
-                        self.predicted_labels.append(label)
-                    except ValueError:
-                        parts = line.split()
-                        for part in parts:
-                            if part:
-                                self.predicted_labels.append(int(part))
-
-        if not self.predicted_labels:
+        if len(labels) == 0:
             raise ValueError("SEG文件没有包含有效的标签数据")
+        if config_hash is not None and config_hash != label_config_hash(self.label_names):
+            print(f"SEG文件的标签配置与当前标签配置不一致: {os.path.basename(file_path)}")
 
-        # 裁剪标签到有效范围
-        if self.colors:
-            max_label = len(self.colors) - 1
-            self.predicted_labels = np.clip(self.predicted_labels, 0, max_label)
-
-        # 更新统计信息
-        unique, counts = np.unique(self.predicted_labels, return_counts=True)
-        self.face_count = len(self.predicted_labels)
-        self.label_counts = [0] * len(self.label_names)
-        for u, c in zip(unique, counts):
-            if u < len(self.label_counts):
-                self.label_counts[u] = c
+        # 裁剪标签到有效范围并更新统计信息
+        self.set_predicted_labels(labels)
 
         return os.path.basename(file_path)
 
@@ -160,15 +183,16 @@ class SegmentationLogic:
         }
 
     def get_predicted_labels(self):
-        """获取预测标签"""
-        return self.predicted_labels.copy()
+        """获取预测标签(只读视图，不复制)"""
+        return self.label_store.labels
 
     def reset(self):
         """重置所有状态"""
-        self.model = None
+        self.close()
+        self.service = None
+        self.last_result = None
         self.label_mapping = None
         self.label_names = ["类别 1", "类别 2"]
         self.colors = [DEFAULT_COLORS[0].copy(), DEFAULT_COLORS[1].copy()]
-        self.predicted_labels = []
-        self.face_count = 0
-        self.label_counts = [0] * len(self.label_names)
\ No newline at end of file
+        self.label_store = LabelStore()
+        self.face_probabilities = None
\ No newline at end of file
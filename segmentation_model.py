@@ -268,8 +268,10 @@ class UVNetSegmenter(nn.Module):
         self.mask_ratio = 0.1
 
     def forward(self, batched_graph):
-        input_crv_feat = batched_graph.edata["x"]
-        input_srf_feat = batched_graph.ndata["x"]
+        # 特征可能以float16保存，只在这里转换为模型参数的精度
+        dtype = self.seg.linear1.weight.dtype
+        input_crv_feat = batched_graph.edata["x"].to(dtype)
+        input_srf_feat = batched_graph.ndata["x"].to(dtype)
         hidden_crv_feat = self.curv_encoder(input_crv_feat)
         hidden_srf_feat = self.surf_encoder(input_srf_feat)
         node_emb, graph_emb = self.graph_encoder(batched_graph, hidden_srf_feat, hidden_crv_feat)
@@ -1,9 +1,10 @@
 import os
+import time
 import numpy as np
 import json  # 添加这一行
 from PyQt5.QtWidgets import (
     QWidget, QMessageBox, QFileDialog, QProgressDialog,
-    QCheckBox, QPushButton, QListWidgetItem, QHBoxLayout, QVBoxLayout
+    QCheckBox, QPushButton, QHBoxLayout, QVBoxLayout
 )
 from PyQt5.QtCore import Qt, QTimer, QPropertyAnimation, QEasingCurve
 from PyQt5.QtGui import QColor
@@ -11,9 +12,31 @@ from OCC.Core.Quantity import Quantity_Color, Quantity_TOC_RGB
 from OCC.Core.TopoDS import TopoDS_Face
 from OCC.Core.TopExp import TopExp_Explorer
 from OCC.Core.TopAbs import TopAbs_FACE
+from OCC.Core.Bnd import Bnd_Box
+from OCC.Core.BRepBndLib import brepbndlib_Add
 from OCC.Extend.DataExchange import read_step_file
 from segmentation_logic import SegmentationLogic  # 添加这一行
+from face_list_model import FACE_INDEX_ROLE
+from mesh_export import MESH_FORMATS, export_colored_mesh
+from scene_cache import Scene
+from shape_cache import CachedShape
+from batch_scheduler import estimate_face_counts, pack_batches
+from seg_io import write_seg_text, write_seg_binary, write_results_json, write_results_npz
+from constants import (
+    LANGUAGE_STRINGS, PROGRESSIVE_DISPLAY_THRESHOLD, DISPLAY_CHUNK_SECONDS,
+    COARSE_MESH_DEFLECTION, FINE_MESH_DEFLECTION, MESH_REFINE_DELAY_MS, MESH_REFINE_BATCH,
+    BATCH_INFERENCE_MAX_FACES
+)
 from PyQt5.QtWidgets import QApplication
+
+# 隐藏类别时使用的颜色和透明度
+HIDDEN_COLOR = Quantity_Color(1.0, 1.0, 1.0, Quantity_TOC_RGB)
+HIDDEN_TRANSPARENCY = 0.7
+# 选择单个面时其余面使用的颜色和透明度
+FADED_COLOR = Quantity_Color(150 / 255.0, 150 / 255.0, 150 / 255.0, Quantity_TOC_RGB)
+FADED_TRANSPARENCY = 0.8
+
+
 class SegmentationUI:
     def batch_process_step_files(self):
         input_dir = QFileDialog.getExistingDirectory(
@@ -36,6 +59,12 @@ class SegmentationUI:
         if not output_dir:
             return
 
+        mesh_reply = QMessageBox.question(
+            self, "批量处理", "是否同时导出带标签颜色的网格(PLY)？",
+            QMessageBox.Yes | QMessageBox.No, QMessageBox.No
+        )
+        export_mesh = mesh_reply == QMessageBox.Yes
+
         step_files = []
         for root, _, files in os.walk(input_dir):
             for file in files:
@@ -66,35 +95,79 @@ class SegmentationUI:
         progress_dialog.setAutoClose(True)
         progress_dialog.setAutoReset(True)
 
-        for i, step_file in enumerate(step_files):
-            progress_dialog.setValue(i)
-            progress_dialog.setLabelText(f"正在处理: {os.path.basename(step_file)}")
-            QApplication.processEvents()
-
-            if progress_dialog.wasCanceled():
+        if self.segmentation_mode == 1:
+            # 按STEP中的面实体数估计大小，从大到小把小零件合并成批，每批只推理一次
+            batches = pack_batches(step_files, estimate_face_counts(step_files), BATCH_INFERENCE_MAX_FACES)
+        else:
+            batches = [[step_file] for step_file in step_files]
+
+        cache_hits = cache_total = 0
+        processed = 0
+        canceled = False
+        for batch in batches:
+            # 逐个文件读取和构图，每个文件之后更新进度并响应取消，只有模型推理合并为一批；
+            # 导出网格时保留读取的形状供导出使用，否则构图后即释放
+            shapes = [None] * len(batch)
+            outcomes = []
+            for i, step_file in enumerate(batch):
+                progress_dialog.setValue(processed + i)
+                progress_dialog.setLabelText(f"正在处理: {os.path.basename(step_file)}")
+                QApplication.processEvents()
+                if progress_dialog.wasCanceled():
+                    canceled = True
+                    break
+                try:
+                    if self.segmentation_mode == 1:
+                        shapes[i] = (read_step_file(step_file) or None) if export_mesh else None
+                        outcomes.append(self.logic.prepare_step_inputs(step_file, shapes[i]))
+                    else:
+                        self.logic.process_step_file(step_file, 2, self.current_bin_file)
+                        outcomes.append(self.logic.last_result)
+                except Exception as e:
+                    outcomes.append(e)
+            if canceled:
                 break
 
-            try:
-                if self.segmentation_mode == 1:
-                    self.logic.process_step_file(step_file, 1)
-                elif self.segmentation_mode == 2:
-                    self.logic.process_step_file(step_file, 2, self.current_bin_file)
-
-                predicted_labels = self.logic.get_predicted_labels()
-
-                base_name = os.path.splitext(os.path.basename(step_file))[0]
-                output_file = os.path.join(output_dir, f"{base_name}.seg")
-
-                with open(output_file, 'w', encoding='utf-8') as f:
-                    for label in predicted_labels:
-                        f.write(f"{label}\n")
-
-            except Exception as e:
-                self.show_error(f"处理文件 {os.path.basename(step_file)} 时出错: {str(e)}")
-                continue
+            if self.segmentation_mode == 1:
+                if len(batch) > 1:
+                    progress_dialog.setLabelText(f"正在推理: {len(batch)} 个文件")
+                    QApplication.processEvents()
+                outcomes = self.logic.run_step_batch(outcomes)
+
+            for step_file, shape, outcome in zip(batch, shapes, outcomes):
+                processed += 1
+                try:
+                    if isinstance(outcome, Exception):
+                        raise outcome
+                    self.logic.apply_result(outcome)
+                    predicted_labels = self.logic.get_predicted_labels()
+                    stats = self.logic.feature_cache_stats
+                    if stats is not None:
+                        cache_hits += stats["hits"]
+                        cache_total += stats["hits"] + stats["misses"]
+
+                    base_name = os.path.splitext(os.path.basename(step_file))[0]
+                    output_file = os.path.join(output_dir, f"{base_name}.seg")
+                    write_seg_text(output_file, predicted_labels)
+
+                    if export_mesh:
+                        progress_dialog.setValue(processed)
+                        progress_dialog.setLabelText(f"正在导出网格: {os.path.basename(step_file)}")
+                        QApplication.processEvents()
+                        label_info = self.logic.get_label_info()
+                        export_colored_mesh(step_file, predicted_labels, label_info["colors"],
+                                            os.path.join(output_dir, f"{base_name}.ply"), label_info["names"],
+                                            cached_shape=CachedShape(step_file, shape) if shape else None)
+
+                except Exception as e:
+                    self.show_error(f"处理文件 {os.path.basename(step_file)} 时出错: {str(e)}")
+                    continue
 
         progress_dialog.setValue(len(step_files))
-        self.update_status(f"批量处理完成，共处理 {len(step_files)} 个STEP文件")
+        message = f"批量处理完成，共处理 {len(step_files)} 个STEP文件"
+        if cache_total:
+            message += f"，特征缓存命中 {cache_hits}/{cache_total} 个面"
+        self.update_status(message)
 
     def create_category_buttons(self):
         while self.category_buttons_layout.count():
@@ -102,6 +175,8 @@ class SegmentationUI:
             if child.widget():
                 child.widget().deleteLater()
 
+        self.build_color_palette()
+
         label_info = self.logic.get_label_info()
         for i, (name, color) in enumerate(zip(label_info["names"], label_info["colors"])):
             container = QWidget()
@@ -135,40 +210,67 @@ class SegmentationUI:
             container.setLayout(hbox)
             self.category_buttons_layout.addWidget(container)
 
-    def toggle_category_visibility(self, category_idx, state):
-        if not self.step_loaded or not hasattr(self, 'ais_list'):
-            return
+        self.update_face_category_filter()
 
+    def build_color_palette(self):
+        """缓存每个类别的Quantity_Color，避免逐面重复创建"""
+        label_info = self.logic.get_label_info()
+        self.color_palette = []
+        # 面当前着色所用的颜色，缓存场景时一起保存
+        self.palette_colors = [list(color) for color in label_info["colors"]]
+        for color_rgb in label_info["colors"]:
+            color_rgb = [max(0, min(255, c)) for c in color_rgb]
+            self.color_palette.append(Quantity_Color(
+                color_rgb[0] / 255.0,
+                color_rgb[1] / 255.0,
+                color_rgb[2] / 255.0,
+                Quantity_TOC_RGB))
+        # None表示该类别当前的显示状态未知，下次切换时需要重新设置
+        self.category_visible = [None] * len(self.color_palette)
+
+    def apply_category_styles(self, visible):
+        """只重新设置显示状态发生变化的类别对应的面"""
         context = self.display.GetContext()
         if not context:
             return
 
-        label_info = self.logic.get_label_info()
-        predicted_labels = self.logic.get_predicted_labels()
+        face_index = self.logic.label_face_index
+        for category_idx, is_visible in enumerate(visible):
+            if category_idx >= len(face_index) or self.category_visible[category_idx] == is_visible:
+                continue
 
-        try:
-            for i, ais in enumerate(self.ais_list):
-                if i >= len(predicted_labels) or not ais:
+            if is_visible:
+                color = self.color_palette[category_idx]
+                transparency = 0.0
+            else:
+                color = HIDDEN_COLOR
+                transparency = HIDDEN_TRANSPARENCY
+
+            for i in face_index[category_idx]:
+                ais = self.ais_list[i] if i < len(self.ais_list) else None
+                if not ais:
                     continue
+                context.SetColor(ais, color, False)
+                context.SetTransparency(ais, transparency, False)
+            self.category_visible[category_idx] = is_visible
 
-                label_num = predicted_labels[i]
-                if label_num == category_idx:
-                    if state == Qt.Checked:
-                        color_rgb = label_info["colors"][label_num]
-                        context.SetColor(ais, Quantity_Color(
-                            color_rgb[0] / 255.0,
-                            color_rgb[1] / 255.0,
-                            color_rgb[2] / 255.0,
-                            Quantity_TOC_RGB), False)
-                        context.SetTransparency(ais, 0.0, False)
-                    else:
-                        context.SetColor(ais, Quantity_Color(
-                            1.0, 1.0, 1.0,
-                            Quantity_TOC_RGB), False)
-                        context.SetTransparency(ais, 0.7, False)
+        # 所有面都已按类别重新着色，退出面选择状态
+        if all(v is not None for v in self.category_visible):
+            self.face_focus_active = False
+            self.selected_faces = []
 
-            context.UpdateCurrentViewer()
-            self.display.Repaint()
+        context.UpdateCurrentViewer()
+        self.display.Repaint()
+
+    def toggle_category_visibility(self, category_idx, state):
+        if not self.step_loaded or not hasattr(self, 'ais_list'):
+            return
+
+        try:
+            # 状态未知的类别(例如面选择后被淡化)恢复为可见
+            visible = [True if v is None else v for v in self.category_visible]
+            visible[category_idx] = state == Qt.Checked
+            self.apply_category_styles(visible)
         except Exception as e:
             print(f"切换类别可见性出错: {str(e)}")
 
@@ -176,100 +278,139 @@ class SegmentationUI:
         if not self.step_loaded or not hasattr(self, 'ais_list'):
             return
 
+        try:
+            visible = [i == category_idx for i in range(len(self.category_visible))]
+            self.apply_category_styles(visible)
+        except Exception as e:
+            print(f"按类别渲染出错: {str(e)}")
+
+    def on_face_selected(self, index):
+        face_index = index.data(FACE_INDEX_ROLE)
+        if face_index is None:
+            return
+
+        try:
+            self.highlight_faces([face_index])
+            self.update_status(self.describe_face(face_index))
+        except Exception as e:
+            print(f"设置显示模式出错: {str(e)}")
+
+    def highlight_faces(self, face_indices):
+        """高亮指定的面，只恢复上一次高亮的面而不重置整个场景"""
         context = self.display.GetContext()
         if not context:
             return
 
-        label_info = self.logic.get_label_info()
-        predicted_labels = self.logic.get_predicted_labels()
+        if not self.face_focus_active:
+            # 首次进入面选择状态时淡化所有面
+            for ais in self.ais_list:
+                if ais:
+                    self._set_face_style(context, ais, FADED_COLOR, FADED_TRANSPARENCY)
+            self.face_focus_active = True
+            self.category_visible = [None] * len(self.category_visible)
+        else:
+            for i in self.selected_faces:
+                if i < len(self.ais_list) and self.ais_list[i]:
+                    self._set_face_style(context, self.ais_list[i], FADED_COLOR, FADED_TRANSPARENCY)
+
+        predicted_labels = self.logic.predicted_labels
+        self.selected_faces = []
+        for i in face_indices:
+            if i >= len(self.ais_list) or not self.ais_list[i]:
+                continue
+            label_num = min(int(predicted_labels[i]), len(self.color_palette) - 1)
+            self._set_face_style(context, self.ais_list[i], self.color_palette[label_num], 0.0)
+            self.selected_faces.append(i)
 
-        try:
-            for i, ais in enumerate(self.ais_list):
-                if i >= len(predicted_labels) or not ais:
-                    continue
+        context.UpdateCurrentViewer()
+        self.fit_to_faces(self.selected_faces)
+        self.display.Repaint()
 
-                label_num = predicted_labels[i]
-                if label_num == category_idx:
-                    color_rgb = label_info["colors"][label_num]
-                    context.SetColor(ais, Quantity_Color(
-                        color_rgb[0] / 255.0,
-                        color_rgb[1] / 255.0,
-                        color_rgb[2] / 255.0,
-                        Quantity_TOC_RGB), False)
-                    context.SetTransparency(ais, 0.0, False)
-                else:
-                    context.SetColor(ais, Quantity_Color(
-                        1.0, 1.0, 1.0,
-                        Quantity_TOC_RGB), False)
-                    context.SetTransparency(ais, 0.7, False)
+    def _set_face_style(self, context, ais, color, transparency):
+        context.SetDisplayMode(ais, 1, False)
+        context.SetColor(ais, color, False)
+        context.SetTransparency(ais, transparency, False)
 
-            context.UpdateCurrentViewer()
-            self.display.Repaint()
-        except Exception as e:
-            print(f"按类别渲染出错: {str(e)}")
+    def fit_to_faces(self, face_indices):
+        """将视图缩放到所选面的包围盒"""
+        box = Bnd_Box()
+        for i in face_indices:
+            if i < len(self.face_shapes):
+                brepbndlib_Add(self.face_shapes[i], box)
+
+        if box.IsVoid():
+            self.display.FitAll()
+        else:
+            self.display.View.FitAll(box, 0.1, False)
 
-    def on_face_selected(self, item):
-        if not hasattr(item, 'face_index'):
+    def on_viewer_face_picked(self, selected_shapes, x, y):
+        """3D视图中点击选择面时，通过哈希表定位面索引并同步面列表"""
+        if not selected_shapes or not self.face_index_map:
             return
 
-        face_index = item.face_index
-        context = self.display.GetContext()
-        if not context:
+        shape = selected_shapes[0]
+        face_index = self.face_index_map.get(shape)
+        if face_index is None:
+            face_index = self.face_index_map.get(shape.Reversed())
+        if face_index is None:
             return
 
         try:
-            for i, ais in enumerate(self.ais_list):
-                if not ais:
-                    continue
-                context.SetDisplayMode(ais, 1, False)
-                context.SetColor(ais,
-                                 Quantity_Color(150 / 255.0, 150 / 255.0, 150 / 255.0, Quantity_TOC_RGB),
-                                 False)
-                context.SetTransparency(ais, 0.8, False)
-
-            if face_index < len(self.ais_list) and self.ais_list[face_index]:
-                selected_ais = self.ais_list[face_index]
-                label_info = self.logic.get_label_info()
-                label_color = label_info["colors"][self.logic.get_predicted_labels()[face_index]]
-
-                context.SetDisplayMode(selected_ais, 1, False)
-                context.SetColor(selected_ais,
-                                 Quantity_Color(
-                                     label_color[0] / 255.0,
-                                     label_color[1] / 255.0,
-                                     label_color[2] / 255.0,
-                                     Quantity_TOC_RGB
-                                 ),
-                                 False)
-                context.SetTransparency(selected_ais, 0.0, False)
-
-            context.UpdateCurrentViewer()
-            self.display.FitAll()
-            self.display.Repaint()
+            self.select_face_in_list(face_index)
+            self.highlight_faces([face_index])
+            self.update_status(self.describe_face(face_index))
         except Exception as e:
-            print(f"设置显示模式出错: {str(e)}")
+            print(f"拾取面出错: {str(e)}")
+
+    def select_face_in_list(self, face_index):
+        row = self.face_list_model.row_of_face(face_index)
+        if row < 0:
+            # 面被过滤条件隐藏时清除过滤条件
+            self.faceSearchEdit.blockSignals(True)
+            self.faceSearchEdit.clear()
+            self.faceSearchEdit.blockSignals(False)
+            self.faceCategoryCombo.setCurrentIndex(0)
+            self.apply_face_filter()
+            row = self.face_list_model.row_of_face(face_index)
+        if row < 0:
+            return
 
-    def populate_face_list(self):
-        self.faceListWidget.clear()
-        self.face_items = []
+        model_index = self.face_list_model.index(row)
+        self.faceListView.setCurrentIndex(model_index)
+        self.faceListView.scrollTo(model_index)
 
+    def describe_face(self, face_index):
         label_info = self.logic.get_label_info()
-        predicted_labels = self.logic.get_predicted_labels()
-
-        for i, label_num in enumerate(predicted_labels):
-            if i >= len(predicted_labels):
-                continue
-
-            label_name = label_info["names"][label_num] if label_num < len(label_info["names"]) else f"未知标签 {label_num}"
-            color = label_info["colors"][label_num] if label_num < len(label_info["colors"]) else [150, 150, 150]
+        label_num = int(self.logic.predicted_labels[face_index])
+        if label_num < len(label_info["names"]):
+            label_name = label_info["names"][label_num]
+        else:
+            label_name = f"未知标签 {label_num}"
 
-            item_text = f"面 {i + 1}: {label_name}"
-            item = QListWidgetItem(item_text)
-            item.face_index = i
+        text = f"面 {face_index + 1}: {label_name}"
+        probabilities = self.logic.face_probabilities
+        if probabilities is not None and face_index < len(probabilities):
+            text += f" (概率 {probabilities[face_index]:.1%})"
+        return text
 
-            item.setForeground(QColor(*color))
-            self.faceListWidget.addItem(item)
-            self.face_items.append(item)
+    def populate_face_list(self):
+        label_info = self.logic.get_label_info()
+        self.face_list_model.set_labels(self.logic.predicted_labels, label_info["names"], label_info["colors"],
+                                        self.logic.label_version)
+
+    def update_face_category_filter(self):
+        """根据当前标签配置重建面列表的类别过滤选项"""
+        self.faceCategoryCombo.blockSignals(True)
+        self.faceCategoryCombo.clear()
+        self.faceCategoryCombo.addItem(LANGUAGE_STRINGS[self.current_language]["all_categories"])
+        self.faceCategoryCombo.addItems(self.logic.get_label_info()["names"])
+        self.faceCategoryCombo.blockSignals(False)
+        self.apply_face_filter()
+
+    def apply_face_filter(self):
+        category_idx = self.faceCategoryCombo.currentIndex()
+        category = category_idx - 1 if category_idx > 0 else None
+        self.face_list_model.set_filter(category, self.faceSearchEdit.text())
 
     def start_segmentation(self):
         if not self.labels_loaded:
@@ -333,7 +474,7 @@ class SegmentationUI:
             self.handle_dropped_labels(file_path)
         elif ext == '.bin':
             self.handle_dropped_bin(file_path)
-        elif ext == '.seg':
+        elif ext in ['.seg', '.segb']:
             self.handle_dropped_seg(file_path)
         else:
             self.show_error("不支持的文件类型")
@@ -406,12 +547,21 @@ class SegmentationUI:
             if self.segmentation_mode == 2 and self.bin_loaded and self.current_bin_file:
                 self.logic.process_step_file(file_path, 2, self.current_bin_file)
             elif self.segmentation_mode == 1:
-                self.logic.process_step_file(file_path, 1)
+                # 与显示共用缓存的形状，STEP文件只解析一次
+                cached_shape = self.shape_cache.get(file_path)
+                self.logic.process_step_file(file_path, 1, shape=cached_shape.shape if cached_shape else None)
             else:
                 raise ValueError("无效的分割模式")
 
             self.display_segmentation(file_path)
-            self.update_status("分割完成")
+            message = "分割完成"
+            instances = self.logic.instance_stats
+            if instances is not None and instances["solids"] > instances["unique"]:
+                message += f"，{instances['solids']} 个实体({instances['unique']} 个不同零件)"
+            stats = self.logic.feature_cache_stats
+            if stats is not None:
+                message += f"，特征缓存命中 {stats['hits']}/{stats['hits'] + stats['misses']} 个面"
+            self.update_status(message)
             self.add_to_history(self.segmentation_mode, file_path,
                                 self.current_bin_file if self.segmentation_mode == 2 else None)
         except Exception as e:
@@ -419,74 +569,228 @@ class SegmentationUI:
 
     def display_segmentation(self, step_file):
         self.clear_display()
-        self.face_items = []
 
-        shape = read_step_file(step_file)
-        if not shape:
+        cached_shape = self.shape_cache.get(step_file)
+        if cached_shape is None:
             print("Failed to load shapes")
             return
 
-        explorer = TopExp_Explorer(shape, TopAbs_FACE)
-        index = 0
-        self.ais_list = []
-        label_info = self.logic.get_label_info()
-        predicted_labels = self.logic.get_predicted_labels()
+        # 首次显示使用粗网格(已缓存更精细网格时跳过)，视图稳定后再细化
+        cached_shape.mesh(COARSE_MESH_DEFLECTION)
+        self.current_shape = cached_shape
+        self.displayed_labels = self.logic.predicted_labels
+        self.face_shapes = cached_shape.faces[:len(self.logic.predicted_labels)]
+        self.face_index_map = {face: i for i, face in enumerate(self.face_shapes)}
 
-        while explorer.More():
-            face = explorer.Current()
-            if face.IsNull():
-                explorer.Next()
-                continue
+        # 保持ais_list与面索引一一对应，尚未显示的面为None
+        self.ais_list = [None] * len(self.face_shapes)
+        self.populate_face_list()
+        self.create_category_buttons()
+        self.category_visible = [True] * len(self.color_palette)
 
-            if not isinstance(face, TopoDS_Face):
-                face = TopoDS_Face(face)
-
-            if index < len(predicted_labels):
-                label_num = min(max(0, int(predicted_labels[index])), len(label_info["colors"]) - 1)
-                color_rgb = label_info["colors"][label_num]
-                color_rgb = [max(0, min(255, c)) for c in color_rgb]
-
-                color = Quantity_Color(
-                    color_rgb[0] / 255.0,
-                    color_rgb[1] / 255.0,
-                    color_rgb[2] / 255.0,
-                    Quantity_TOC_RGB
-                )
-
-                ais_shape = self.display.DisplayShape(face, color=color, update=True)
-                if ais_shape:
-                    if isinstance(ais_shape, list):
-                        self.ais_list.append(ais_shape[0])
-                    else:
-                        self.ais_list.append(ais_shape)
-                index += 1
+        if len(self.face_shapes) >= PROGRESSIVE_DISPLAY_THRESHOLD:
+            self.start_progressive_display()
+        else:
+            for i in range(len(self.face_shapes)):
+                self.display_face(i)
+            self.display.FitAll()
+            self.display.Repaint()
+            self.schedule_mesh_refinement()
+
+    def display_face(self, face_index):
+        """显示单个面，颜色和透明度与当前的类别/面选择状态一致"""
+        label_num = min(max(0, int(self.logic.predicted_labels[face_index])), len(self.color_palette) - 1)
+        if self.face_focus_active and face_index not in self.selected_faces:
+            color, transparency = FADED_COLOR, FADED_TRANSPARENCY
+        elif self.category_visible[label_num] is False:
+            color, transparency = HIDDEN_COLOR, HIDDEN_TRANSPARENCY
+        else:
+            color, transparency = self.color_palette[label_num], None
+
+        ais_shape = self.display.DisplayShape(self.face_shapes[face_index], color=color,
+                                              transparency=transparency, update=False)
+        if isinstance(ais_shape, list):
+            ais_shape = ais_shape[0] if ais_shape else None
+        self.ais_list[face_index] = ais_shape
+
+    def start_progressive_display(self):
+        """按面积从大到小分批显示面，期间界面保持响应"""
+        areas = self.current_shape.face_areas()[:len(self.face_shapes)]
+        self.pending_faces = np.argsort(-areas, kind="stable")
+        self.pending_position = 0
+        self.cancelDisplayButton.setVisible(True)
+        self.display_timer.start(0)
+
+    def display_next_chunk(self):
+        deadline = time.perf_counter() + DISPLAY_CHUNK_SECONDS
+        first_chunk = self.pending_position == 0
+        try:
+            while self.pending_position < len(self.pending_faces) and time.perf_counter() < deadline:
+                self.display_face(int(self.pending_faces[self.pending_position]))
+                self.pending_position += 1
+        except Exception as e:
+            print(f"渐进显示出错: {str(e)}")
+            self.stop_progressive_display()
+            return
+
+        context = self.display.GetContext()
+        context.UpdateCurrentViewer()
+        if first_chunk:
+            self.display.FitAll()
+        self.display.Repaint()
 
-            explorer.Next()
+        total = len(self.pending_faces)
+        self.cancelDisplayButton.setText(
+            f"{LANGUAGE_STRINGS[self.current_language]['cancel_display']} ({self.pending_position}/{total})")
+        if self.pending_position >= total:
+            self.stop_progressive_display()
+            self.schedule_mesh_refinement()
+
+    def stop_progressive_display(self):
+        self.display_timer.stop()
+        self.pending_faces = np.zeros(0, dtype=np.int64)
+        self.pending_position = 0
+        self.cancelDisplayButton.setVisible(False)
+
+    def cancel_progressive_display(self):
+        if not self.display_timer.isActive():
+            return
+        shown = self.pending_position
+        total = len(self.pending_faces)
+        self.stop_progressive_display()
+        self.update_status(f"已取消显示，已显示 {shown}/{total} 个面")
+
+    def schedule_mesh_refinement(self):
+        """视图稳定一段时间后在后台分批细化网格"""
+        if self.current_shape is not None and not self.current_shape.is_meshed(FINE_MESH_DEFLECTION):
+            self.refine_delay_timer.start(MESH_REFINE_DELAY_MS)
+
+    def start_mesh_refinement(self):
+        self.refine_position = 0
+        self.refine_timer.start(0)
+
+    def refine_next_chunk(self):
+        deadline = time.perf_counter() + DISPLAY_CHUNK_SECONDS
+        context = self.display.GetContext()
+        total = len(self.face_shapes)
+        try:
+            while self.refine_position < total and time.perf_counter() < deadline:
+                chunk = range(self.refine_position, min(self.refine_position + MESH_REFINE_BATCH, total))
+                self.current_shape.mesh_faces(chunk, FINE_MESH_DEFLECTION)
+                for i in chunk:
+                    if self.ais_list[i]:
+                        context.Redisplay(self.ais_list[i], False)
+                self.refine_position = chunk.stop
+        except Exception as e:
+            print(f"细化网格出错: {str(e)}")
+            self.stop_mesh_refinement()
+            return
 
+        context.UpdateCurrentViewer()
+        self.display.Repaint()
+        if self.refine_position >= total:
+            self.stop_mesh_refinement()
+            if total == len(self.current_shape.faces):
+                self.current_shape.mesh_deflection = self.current_shape.deflection(FINE_MESH_DEFLECTION)
+
+    def stop_mesh_refinement(self):
+        self.refine_delay_timer.stop()
+        self.refine_timer.stop()
+        self.refine_position = 0
+
+    def cache_current_scene(self, context):
+        """擦除(而非移除)已完整显示的当前场景并放入场景缓存"""
+        if self.current_history_id is None or not self.ais_list or any(ais is None for ais in self.ais_list):
+            return False
+
+        scene = Scene(self.current_history_id, self.current_shape, self.face_shapes, self.face_index_map,
+                      self.ais_list, self.displayed_labels, self.palette_colors,
+                      list(self.category_visible), self.face_focus_active)
+        for ais in self.ais_list:
+            context.Erase(ais, False)
+        for evicted in self.scene_cache.put(scene):
+            self.remove_scene(context, evicted)
+        return True
+
+    def remove_scene(self, context, scene):
+        for ais in scene.ais_list:
+            if ais:
+                context.Remove(ais, False)
+
+    def take_cached_scene(self, key):
+        """从缓存中取出场景，STEP文件已修改时丢弃"""
+        scene = self.scene_cache.pop(key)
+        if scene is None:
+            return None
+        step_file = scene.cached_shape.step_file
+        if not os.path.exists(step_file) or os.path.getmtime(step_file) != scene.cached_shape.mtime:
+            self.remove_scene(self.display.GetContext(), scene)
+            return None
+        return scene
+
+    def show_cached_scene(self, scene):
+        """重新显示缓存的场景，只重新设置着色状态与当前不同的类别"""
+        self.clear_display()
+        context = self.display.GetContext()
+        for ais in scene.ais_list:
+            context.Display(ais, False)
+
+        self.current_shape = scene.cached_shape
+        self.face_shapes = scene.face_shapes
+        self.face_index_map = scene.face_index_map
+        self.ais_list = scene.ais_list
+        self.displayed_labels = self.logic.predicted_labels
         self.populate_face_list()
         self.create_category_buttons()
+
+        if self.palette_colors == scene.palette and not scene.face_focus_active:
+            self.category_visible = list(scene.category_visible)
+        self.apply_category_styles([True] * len(self.color_palette))
         self.display.FitAll()
         self.display.Repaint()
+        self.schedule_mesh_refinement()
 
     def clear_display(self):
+        self.stop_progressive_display()
+        self.stop_mesh_refinement()
         context = self.display.GetContext()
         if not context:
             return
 
-        context.RemoveAll(False)
+        if not self.cache_current_scene(context):
+            if len(self.scene_cache):
+                # 缓存的场景仍在上下文中，只移除当前场景
+                for ais in self.ais_list:
+                    if ais:
+                        context.Remove(ais, False)
+            else:
+                context.RemoveAll(False)
+        self.current_history_id = None
+        self.current_shape = None
+        self.displayed_labels = None
         self.ais_list = []
+        self.face_shapes = []
+        self.face_index_map = {}
+        self.selected_faces = []
+        self.face_focus_active = False
         context.UpdateCurrentViewer()
         self.display.FitAll()
         self.display.Repaint()
-        self.faceListWidget.clear()
-        self.face_items = []
+        self.face_list_model.clear()
 
     def clear_all(self):
+        self.current_history_id = None
         self.clear_display()
+        self.scene_cache.clear()
+        context = self.display.GetContext()
+        if context:
+            context.RemoveAll(False)
+            context.UpdateCurrentViewer()
         self.current_model = None
         self.current_step_file = None
         self.current_bin_file = None
         self.current_seg_file = None
+        self.logic.close()
         self.logic = SegmentationLogic()
         self.model_loaded = False
         self.labels_loaded = False
@@ -499,6 +803,7 @@ class SegmentationUI:
             child = self.category_buttons_layout.takeAt(0)
             if child.widget():
                 child.widget().deleteLater()
+        self.update_face_category_filter()
 
         for btn in [self.loadModelButton, self.loadLabelsButton, self.loadButton,
                     self.loadBinButton, self.loadSegButton]:
@@ -550,7 +855,7 @@ class SegmentationUI:
             self,
             "选择BIN图文件",
             "",
-            "BIN文件 (*.bin)"
+            "BIN文件 (*.bin);;图数据集索引 (index.json)"
         )
         if file_name:
             self.handle_dropped_bin(file_name)
@@ -560,7 +865,7 @@ class SegmentationUI:
             self,
             "选择SEG文件",
             "",
-            "SEG文件 (*.seg)"
+            "SEG文件 (*.seg *.segb)"
         )
         if file_name:
             self.handle_dropped_seg(file_name)
@@ -572,7 +877,9 @@ class SegmentationUI:
 
         file_name, selected_filter = QFileDialog.getSaveFileName(
             self, "保存结果", "",
-            "JSON文件 (*.json);;文本文件 (*.txt);;纯文本SEG (*.seg);;所有文件 (*)"
+            "JSON文件 (*.json);;紧凑JSON(游程编码) (*.json);;NumPy压缩数组 (*.npz);;"
+            "文本文件 (*.txt);;纯文本SEG (*.seg);;二进制SEG (*.segb);;"
+            "彩色网格PLY (*.ply);;彩色网格glTF (*.glb);;彩色网格OBJ (*.obj);;所有文件 (*)"
         )
 
         if not file_name:
@@ -581,15 +888,31 @@ class SegmentationUI:
         try:
             label_info = self.logic.get_label_info()
             predicted_labels = self.logic.get_predicted_labels()
-            label_counts = label_info["counts"]
-
-            predicted_labels = self.convert_to_python_types(predicted_labels)
-            label_counts = self.convert_to_python_types(label_counts)
-
-            if selected_filter == "纯文本SEG (*.seg)":
-                with open(file_name, 'w', encoding='utf-8') as f:
-                    for label in predicted_labels:
-                        f.write(f"{label}\n")
+            # 标签保持为NumPy数组，只转换类别级别的小数据
+            label_counts = self.convert_to_python_types(label_info["counts"])
+            metadata = {
+                "model": os.path.basename(self.current_model) if self.current_model else "未知",
+                "step_file": os.path.basename(self.current_step_file),
+                "total_faces": len(predicted_labels),
+                "label_distribution": {
+                    label_info['names'][i]: count for i, count in enumerate(label_counts)
+                },
+                "label_colors": self.convert_to_python_types(label_info["colors"]),
+                "label_names": label_info["names"]
+            }
+
+            if os.path.splitext(file_name)[1].lower() in MESH_FORMATS:
+                # 复用显示时缓存并剖分过的形状
+                cached_shape = self.shape_cache.get(self.current_step_file)
+                export_colored_mesh(self.current_step_file, self.logic.predicted_labels, label_info["colors"],
+                                    file_name, label_info["names"], cached_shape=cached_shape)
+            elif selected_filter == "NumPy压缩数组 (*.npz)" or file_name.lower().endswith('.npz'):
+                write_results_npz(file_name, metadata, predicted_labels,
+                                  label_info["names"], label_info["colors"])
+            elif selected_filter == "二进制SEG (*.segb)" or file_name.lower().endswith('.segb'):
+                write_seg_binary(file_name, predicted_labels, label_info["names"])
+            elif selected_filter == "纯文本SEG (*.seg)":
+                write_seg_text(file_name, predicted_labels)
             elif file_name.endswith('.txt'):
                 with open(file_name, 'w', encoding='utf-8') as f:
                     f.write(f"3D CAD 分割结果报告\n")
@@ -603,19 +926,8 @@ class SegmentationUI:
                             percentage = count / len(predicted_labels) * 100
                             f.write(f"{label_info['names'][i]}: {count} ({percentage:.1f}%)\n")
             else:
-                results = {
-                    "model": os.path.basename(self.current_model) if self.current_model else "未知",
-                    "step_file": os.path.basename(self.current_step_file),
-                    "total_faces": len(predicted_labels),
-                    "label_distribution": {
-                        label_info['names'][i]: count for i, count in enumerate(label_counts)
-                    },
-                    "face_labels": predicted_labels,
-                    "label_colors": label_info["colors"],
-                    "label_names": label_info["names"]
-                }
-                with open(file_name, 'w', encoding='utf-8') as f:
-                    json.dump(results, f, ensure_ascii=False, indent=4)
+                write_results_json(file_name, metadata, predicted_labels,
+                                   run_length=selected_filter.startswith("紧凑JSON"))
 
             self.update_status(f"结果已保存到: {os.path.basename(file_name)}")
         except Exception as e:
@@ -0,0 +1,110 @@
+# shape_cache.py
+import os
+import math
+from collections import OrderedDict
+import numpy as np
+from OCC.Core.BRep import BRep_Builder
+from OCC.Core.BRepMesh import BRepMesh_IncrementalMesh
+from OCC.Core.Bnd import Bnd_Box
+from OCC.Core.BRepBndLib import brepbndlib_Add
+from OCC.Core.TopAbs import TopAbs_FACE
+from OCC.Core.TopExp import TopExp_Explorer
+from OCC.Core.TopoDS import TopoDS_Compound, TopoDS_Face
+from OCC.Extend.DataExchange import read_step_file
+from constants import MESH_ANGULAR_DEFLECTION, SHAPE_CACHE_SIZE
+
+
+class CachedShape:
+    """解析后的STEP形状，三角网格保存在形状的面上随缓存一起复用"""
+
+    def __init__(self, step_file, shape):
+        self.step_file = step_file
+        self.mtime = os.path.getmtime(step_file)
+        self.shape = shape
+        # 当前三角网格的弦高误差，None表示尚未剖分
+        self.mesh_deflection = None
+        self._face_areas = None
+
+        self.faces = []
+        explorer = TopExp_Explorer(shape, TopAbs_FACE)
+        while explorer.More():
+            face = explorer.Current()
+            if not face.IsNull():
+                if not isinstance(face, TopoDS_Face):
+                    face = TopoDS_Face(face)
+                self.faces.append(face)
+            explorer.Next()
+
+        box = Bnd_Box()
+        brepbndlib_Add(shape, box)
+        self.diagonal = 1.0 if box.IsVoid() else math.sqrt(box.SquareExtent())
+
+    def deflection(self, relative_deflection):
+        """相对于模型包围盒对角线的弦高误差"""
+        return self.diagonal * relative_deflection
+
+    def is_meshed(self, relative_deflection):
+        return self.mesh_deflection is not None and self.mesh_deflection <= self.deflection(relative_deflection)
+
+    def mesh(self, relative_deflection):
+        """并行剖分整个形状，已有同等或更精细的网格时跳过"""
+        if self.is_meshed(relative_deflection):
+            return False
+        deflection = self.deflection(relative_deflection)
+        BRepMesh_IncrementalMesh(self.shape, deflection, False, MESH_ANGULAR_DEFLECTION, True)
+        self.mesh_deflection = deflection
+        return True
+
+    def mesh_faces(self, face_indices, relative_deflection):
+        """并行剖分部分面，用于后台分批细化网格"""
+        builder = BRep_Builder()
+        compound = TopoDS_Compound()
+        builder.MakeCompound(compound)
+        for i in face_indices:
+            builder.Add(compound, self.faces[i])
+        BRepMesh_IncrementalMesh(compound, self.deflection(relative_deflection), False,
+                                 MESH_ANGULAR_DEFLECTION, True)
+
+    def face_areas(self):
+        """用包围盒估算每个面的面积，精确积分面积的开销与显示本身相当"""
+        if self._face_areas is None:
+            areas = np.zeros(len(self.faces))
+            for i, face in enumerate(self.faces):
+                box = Bnd_Box()
+                brepbndlib_Add(face, box)
+                if not box.IsVoid():
+                    xmin, ymin, zmin, xmax, ymax, zmax = box.Get()
+                    extents = sorted([xmax - xmin, ymax - ymin, zmax - zmin])
+                    areas[i] = extents[1] * extents[2]
+            self._face_areas = areas
+        return self._face_areas
+
+
+class ShapeCache:
+    """按文件缓存最近解析的STEP形状(LRU)"""
+
+    def __init__(self, max_size=SHAPE_CACHE_SIZE):
+        self.max_size = max_size
+        self.entries = OrderedDict()
+
+    def get(self, step_file):
+        """返回缓存的形状，文件修改后重新读取，读取失败时返回None"""
+        key = os.path.abspath(step_file)
+        entry = self.entries.get(key)
+        if entry is not None and entry.mtime == os.path.getmtime(step_file):
+            self.entries.move_to_end(key)
+            return entry
+
+        shape = read_step_file(step_file)
+        if not shape:
+            return None
+
+        entry = CachedShape(step_file, shape)
+        self.entries[key] = entry
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_size:
+            self.entries.popitem(last=False)
+        return entry
+
+    def clear(self):
+        self.entries.clear()
@@ -0,0 +1,69 @@
+# tests/test_face_sampling.py
+import pytest
+
+pytest.importorskip("OCC.Core.BRepPrimAPI")
+pytest.importorskip("occwl")
+
+from OCC.Core.BRepPrimAPI import (
+    BRepPrimAPI_MakeBox, BRepPrimAPI_MakeCylinder, BRepPrimAPI_MakeCone, BRepPrimAPI_MakeSphere
+)
+from OCC.Core.BRepAlgoAPI import BRepAlgoAPI_Cut
+from OCC.Core.TopAbs import TopAbs_FACE
+from OCC.Core.TopExp import TopExp_Explorer
+from OCC.Core.TopLoc import TopLoc_Location
+from OCC.Core.TopoDS import TopoDS_Face
+from OCC.Core.gp import gp_Trsf, gp_Ax1, gp_Ax2, gp_Pnt, gp_Dir, gp_Vec
+from face_sampling import shape_parity, trimming_mask
+
+TOLERANCE = 1e-6
+
+
+def _box_with_hole():
+    box = BRepPrimAPI_MakeBox(10.0, 10.0, 4.0).Shape()
+    tool = BRepPrimAPI_MakeCylinder(gp_Ax2(gp_Pnt(5.0, 5.0, -1.0), gp_Dir(0.0, 0.0, 1.0)), 2.0, 6.0).Shape()
+    return BRepAlgoAPI_Cut(box, tool).Shape()
+
+
+# 每种形状及其必须覆盖的曲面/曲线类型
+PRIMITIVES = {
+    "box": (lambda: BRepPrimAPI_MakeBox(1.0, 2.0, 3.0).Shape(), {"plane", "line"}),
+    "cylinder": (lambda: BRepPrimAPI_MakeCylinder(1.5, 3.0).Shape(), {"plane", "cylinder", "line", "circle"}),
+    "cone": (lambda: BRepPrimAPI_MakeCone(2.0, 0.5, 3.0).Shape(), {"plane", "cone", "line", "circle"}),
+    "sphere": (lambda: BRepPrimAPI_MakeSphere(2.0).Shape(), {"sphere", "circle"}),
+    "box_with_hole": (_box_with_hole, {"plane", "cylinder", "line", "circle"}),
+}
+
+
+def _variant(shape, variant):
+    if variant == "reversed":
+        return shape.Reversed()
+    if variant == "located":
+        trsf = gp_Trsf()
+        trsf.SetRotation(gp_Ax1(gp_Pnt(0.0, 0.0, 0.0), gp_Dir(1.0, 1.0, 0.0)), 0.7)
+        trsf.SetTranslationPart(gp_Vec(3.0, -2.0, 5.0))
+        return shape.Moved(TopLoc_Location(trsf))
+    return shape
+
+
+@pytest.mark.parametrize("variant", ["plain", "reversed", "located"])
+@pytest.mark.parametrize("name", sorted(PRIMITIVES))
+def test_analytic_sampling_matches_occwl(name, variant):
+    make, expected_types = PRIMITIVES[name]
+    deviations = shape_parity(_variant(make(), variant))
+    assert expected_types <= set(deviations)
+    for kind, (count, point_error, direction_error) in deviations.items():
+        assert count > 0
+        assert point_error <= TOLERANCE, f"{kind}: point/mask deviation {point_error}"
+        assert direction_error <= TOLERANCE, f"{kind}: direction deviation {direction_error}"
+
+
+def test_hole_is_masked_out():
+    # 带孔的平面必须走分类器路径并得到被裁掉的采样点，上面的比较才覆盖裁剪掩码
+    explorer = TopExp_Explorer(_box_with_hole(), TopAbs_FACE)
+    trimmed = 0
+    while explorer.More():
+        face = explorer.Current()
+        face = face if isinstance(face, TopoDS_Face) else TopoDS_Face(face)
+        trimmed += int(not trimming_mask(face, 10, 10).all())
+        explorer.Next()
+    assert trimmed > 0
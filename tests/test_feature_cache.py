@@ -0,0 +1,30 @@
+# tests/test_feature_cache.py
+import numpy as np
+from feature_cache import FaceFeatureCache
+
+
+def _features(prefix, n):
+    return {f"{prefix}{i}": np.full((2, 2, 7), i, dtype=np.float32) for i in range(n)}
+
+
+def test_round_trip_and_stats(tmp_path):
+    cache = FaceFeatureCache(str(tmp_path / "features.db"), max_faces=0)
+    cache.put_many(_features("a", 3))
+    found = cache.get_many(["a0", "a2", "missing"])
+    assert sorted(found) == ["a0", "a2"]
+    assert np.array_equal(found["a2"], np.full((2, 2, 7), 2, dtype=np.float32))
+    assert cache.stats()["hits"] == 2 and cache.stats()["misses"] == 1
+    cache.close()
+
+
+def test_prune_keeps_recently_used_faces(tmp_path):
+    cache = FaceFeatureCache(str(tmp_path / "features.db"), max_faces=20)
+    cache.put_many(_features("old", 20))
+    cache.get_many(["old0"])
+    for batch in range(4):
+        cache.put_many(_features(f"new{batch}_", 2))
+    # 每写入max_faces * PRUNE_MARGIN个面检查一次，超出时删除最久未使用的面
+    assert cache.count() == 20
+    assert "old0" in cache.get_many(["old0"])
+    assert len(cache.get_many([f"new{batch}_{i}" for batch in range(4) for i in range(2)])) == 8
+    cache.close()
@@ -0,0 +1,49 @@
+# tests/test_history_store.py
+import json
+import os
+import numpy as np
+import pytest
+from history_store import HistoryStore
+
+
+def _legacy(labels, name="a.step"):
+    return {"time": "2025-01-01 00:00:00", "mode": "模式1", "step_file": name, "extra_file": "",
+            "step_path": name, "extra_path": "", "label_info": {"names": ["x", "y"], "colors": []},
+            "labels": labels}
+
+
+def test_import_json_skips_invalid_records_in_one_transaction(tmp_path):
+    json_path = tmp_path / "history.json"
+    json_path.write_text(json.dumps([_legacy([0, 1, 1]), _legacy([-1]), _legacy(["a"]), _legacy([1], "b.step")]),
+                         encoding="utf-8")
+    store = HistoryStore(str(tmp_path / "history.db"), max_records=0)
+    assert store.import_json(str(json_path)) == (2, 2)
+    assert store.count() == 2
+    assert not json_path.exists()
+    assert os.path.exists(str(json_path) + ".migrated")
+
+    records = store.query_records(descending=False)
+    assert records[0]["label_counts"] == [1, 2]
+    assert np.array_equal(store.load_labels(records[0]["id"]), [0, 1, 1])
+    store.close()
+
+
+def test_import_json_rolls_back_on_error(tmp_path, monkeypatch):
+    json_path = tmp_path / "history.json"
+    json_path.write_text(json.dumps([_legacy([0]), _legacy([1])]), encoding="utf-8")
+    store = HistoryStore(str(tmp_path / "history.db"), max_records=0)
+    insert = store._insert
+    calls = []
+
+    def failing_insert(record, labels):
+        calls.append(record)
+        if len(calls) == 2:
+            raise OSError("disk full")
+        return insert(record, labels)
+
+    monkeypatch.setattr(store, "_insert", failing_insert)
+    with pytest.raises(OSError):
+        store.import_json(str(json_path))
+    assert store.count() == 0
+    assert json_path.exists()
+    store.close()
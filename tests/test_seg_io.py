@@ -0,0 +1,28 @@
+# tests/test_seg_io.py
+import numpy as np
+import pytest
+from seg_io import parse_seg_text, read_seg_text
+
+
+@pytest.mark.parametrize("data", [b"", b"\n", b"  \n\n", b"\r\n\t ", "", " \n"])
+def test_blank_seg_text_is_empty(data):
+    labels = parse_seg_text(data)
+    assert labels.dtype == np.int64
+    assert len(labels) == 0
+
+
+def test_mixed_separators():
+    assert parse_seg_text(b"1\n2 3\t4\r\n\n5  6").tolist() == [1, 2, 3, 4, 5, 6]
+    assert parse_seg_text("0\n1\n").tolist() == [0, 1]
+
+
+@pytest.mark.parametrize("data", [b"1 x 2", b"1.5 2", b"label\n"])
+def test_invalid_tokens_raise(data):
+    with pytest.raises(ValueError):
+        parse_seg_text(data)
+
+
+def test_read_blank_seg_file(tmp_path):
+    path = tmp_path / "blank.seg"
+    path.write_bytes(b"\n\n")
+    assert len(read_seg_text(str(path))) == 0
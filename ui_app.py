@@ -8,16 +8,20 @@ from PyQt5.QtCore import Qt, QTimer, QUrl, QPropertyAnimation, QEasingCurve
 from PyQt5.QtWidgets import (
     QApplication, QWidget, QPushButton, QHBoxLayout, QVBoxLayout,
     QLabel, QFileDialog, QMessageBox, QGroupBox, QFrame, QSizePolicy,
-    QGridLayout, QComboBox, QScrollArea, QLineEdit, QDialog, QListWidget,
-    QCheckBox, QListWidgetItem, QTableWidget, QTableWidgetItem, QProgressDialog
+    QGridLayout, QComboBox, QScrollArea, QLineEdit, QDialog, QListView,
+    QCheckBox, QTableWidget, QTableWidgetItem, QProgressDialog
 )
 from PyQt5.QtGui import QFont, QColor, QDragEnterEvent, QDropEvent
 from OCC.Display.backend import load_backend
 from segmentation_ui import SegmentationUI
 from history_dialog import HistoryDialog
+from history_store import HistoryStore
 from label_config import LabelConfigDialog
+from face_list_model import FaceListModel
+from shape_cache import ShapeCache
+from scene_cache import SceneCache
 from segmentation_logic import SegmentationLogic
-from constants import DEFAULT_COLORS, STYLESHEET, LANGUAGE_STRINGS
+from constants import DEFAULT_COLORS, STYLESHEET, LANGUAGE_STRINGS, LEGACY_HISTORY_PATH
 from PyQt5.QtWidgets import QApplication
 
 load_backend("pyqt5")
@@ -43,21 +47,46 @@ class SegmentationApp(QWidget, SegmentationUI):
         self.current_seg_file = None
         self.current_model = None
         self.ais_list = []
+        self.face_shapes = []
+        self.face_index_map = {}
+        self.selected_faces = []
+        self.face_focus_active = False
+        self.color_palette = []
+        self.category_visible = []
+        self.pending_faces = np.zeros(0, dtype=np.int64)
+        self.pending_position = 0
+        self.refine_position = 0
+        self.shape_cache = ShapeCache()
+        self.current_shape = None
+        self.displayed_labels = None
+        self.palette_colors = []
+        self.scene_cache = SceneCache()
+        # 当前显示的场景对应的历史记录id，切换场景时据此缓存
+        self.current_history_id = None
         self.model_loaded = False
         self.labels_loaded = False
         self.step_loaded = False
         self.bin_loaded = False
         self.seg_loaded = False
         self.segmentation_mode = 1
-        self.face_items = []
-        self.history = []
+        self.history_store = None
         self.current_language = "zh"  # Default to Chinese
 
         self.canvas = qtViewer3d(self)
+        self.display_timer = QTimer(self)
+        self.display_timer.timeout.connect(self.display_next_chunk)
+        self.refine_delay_timer = QTimer(self)
+        self.refine_delay_timer.setSingleShot(True)
+        self.refine_delay_timer.timeout.connect(self.start_mesh_refinement)
+        self.refine_timer = QTimer(self)
+        self.refine_timer.timeout.connect(self.refine_next_chunk)
         self.setup_ui()
         self.setup_style()
         self.canvas.InitDriver()
         self.display = self.canvas._display
+        # 面在显示前已由ShapeCache并行剖分，AIS直接使用已有网格
+        self.display.Context.DefaultDrawer().SetAutoTriangulation(False)
+        self.display.register_select_callback(self.on_viewer_face_picked)
         self.setAcceptDrops(True)
         QTimer.singleShot(300, self.force_refresh_display)
         self.load_history()
@@ -240,7 +269,13 @@ class SegmentationApp(QWidget, SegmentationUI):
         info_label.setAlignment(Qt.AlignRight)
         info_label.setStyleSheet("color: #666; font-size: 10px;")
 
+        self.cancelDisplayButton = QPushButton(LANGUAGE_STRINGS[self.current_language]["cancel_display"])
+        self.cancelDisplayButton.setCursor(Qt.PointingHandCursor)
+        self.cancelDisplayButton.clicked.connect(self.cancel_progressive_display)
+        self.cancelDisplayButton.setVisible(False)
+
         status_layout.addWidget(self.predictionLabel)
+        status_layout.addWidget(self.cancelDisplayButton)
         status_layout.addWidget(info_label)
         status_frame.setLayout(status_layout)
         left_layout.addWidget(status_frame)
@@ -267,10 +302,28 @@ class SegmentationApp(QWidget, SegmentationUI):
         self.category_buttons_frame.setLayout(self.category_buttons_layout)
         right_layout.addWidget(self.category_buttons_frame)
 
-        self.faceListWidget = QListWidget()
-        self.faceListWidget.setSelectionMode(QListWidget.SingleSelection)
-        self.faceListWidget.itemClicked.connect(self.on_face_selected)
-        right_layout.addWidget(self.faceListWidget)
+        self.faceCategoryCombo = QComboBox()
+        self.faceCategoryCombo.addItem(LANGUAGE_STRINGS[self.current_language]["all_categories"])
+        self.faceCategoryCombo.currentIndexChanged.connect(self.apply_face_filter)
+        right_layout.addWidget(self.faceCategoryCombo)
+
+        self.faceSearchEdit = QLineEdit()
+        self.faceSearchEdit.setPlaceholderText(LANGUAGE_STRINGS[self.current_language]["search_faces"])
+        # 大型零件的面很多，输入停顿后再过滤
+        self.face_filter_timer = QTimer(self)
+        self.face_filter_timer.setSingleShot(True)
+        self.face_filter_timer.setInterval(200)
+        self.face_filter_timer.timeout.connect(self.apply_face_filter)
+        self.faceSearchEdit.textChanged.connect(self.face_filter_timer.start)
+        right_layout.addWidget(self.faceSearchEdit)
+
+        self.face_list_model = FaceListModel(self)
+        self.faceListView = QListView()
+        self.faceListView.setModel(self.face_list_model)
+        self.faceListView.setUniformItemSizes(True)
+        self.faceListView.setSelectionMode(QListView.SingleSelection)
+        self.faceListView.clicked.connect(self.on_face_selected)
+        right_layout.addWidget(self.faceListView)
 
         right_panel.setLayout(right_layout)
 
@@ -319,6 +372,9 @@ class SegmentationApp(QWidget, SegmentationUI):
         self.predictionLabel.setText(strings["ready"])
         self.drop_label.setText(strings["drop_file"])
         self.modeComboLabel.setText(strings["choose_mode"])
+        self.faceSearchEdit.setPlaceholderText(strings["search_faces"])
+        self.cancelDisplayButton.setText(strings["cancel_display"])
+        self.faceCategoryCombo.setItemText(0, strings["all_categories"])
 
         # Update language toggle button text
         self.languageButton.setText("中文" if lang == "en" else "EN")
@@ -367,6 +423,7 @@ class SegmentationApp(QWidget, SegmentationUI):
             self.logic.update_label_config(config)
             self.segmentButton.setEnabled(True)
             self.update_status("标签配置已更新")
+            self.populate_face_list()
             self.create_category_buttons()
 
     def show_examples(self):
@@ -423,6 +480,8 @@ class SegmentationApp(QWidget, SegmentationUI):
         QMessageBox.critical(self, "错误", message)
 
     def add_to_history(self, mode, step_file, extra_file=None):
+        if self.history_store is None:
+            return
         record = {
             "time": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
             "mode": f"模式{mode}",
@@ -430,24 +489,27 @@ class SegmentationApp(QWidget, SegmentationUI):
             "extra_file": os.path.basename(extra_file) if extra_file else "",
             "step_path": step_file,
             "extra_path": extra_file if extra_file else "",
-            "labels": self.convert_to_python_types(self.logic.get_predicted_labels()),
             "label_info": self.convert_to_python_types(self.logic.get_label_info())
         }
-        self.history.append(record)
-
-        if len(self.history) > 50:
-            self.history = self.history[-50:]
+        try:
+            self.current_history_id = self.history_store.add(record, self.logic.get_predicted_labels())
+        except Exception as e:
+            print(f"保存历史记录出错: {str(e)}")
 
     def show_history(self):
-        if not self.history:
+        if self.history_store is None or self.history_store.count() == 0:
             QMessageBox.information(self, "历史记录", "没有历史记录")
             return
 
-        dialog = HistoryDialog(self.history, self)
+        dialog = HistoryDialog(self.history_store, self)
         dialog.exec_()
 
     def load_from_history(self, record):
         try:
+            # 先缓存当前场景，再取出要恢复的场景(可能正是当前场景)
+            self.clear_display()
+            scene = self.take_cached_scene(record["id"])
+
             self.current_step_file = record["step_path"]
             self.step_loaded = True
             self.loadButton.setProperty("loaded", "true")
@@ -464,43 +526,46 @@ class SegmentationApp(QWidget, SegmentationUI):
             })
             self.labels_loaded = True
 
-            self.logic.predicted_labels = np.array(record["labels"])
-            self.logic.face_count = len(record["labels"])
-            self.logic.label_counts = [0] * len(record["label_info"]["names"])
-
-            labels = self.convert_to_python_types(record["labels"])
-            unique, counts = np.unique(labels, return_counts=True)
-
-            for u, c in zip(unique, counts):
-                if u < len(self.logic.label_counts):
-                    self.logic.label_counts[u] = c
-
-            self.display_segmentation(record["step_path"])
+            # 最近显示过的记录直接恢复缓存的场景
+            if scene is not None:
+                labels = scene.labels
+            else:
+                labels = self.history_store.load_labels(record["id"])
+                if labels is None:
+                    raise ValueError("历史记录已被删除")
+            self.logic.set_predicted_labels(labels)
+
+            if scene is not None:
+                self.show_cached_scene(scene)
+            else:
+                self.display_segmentation(record["step_path"])
+            self.current_history_id = record["id"]
             self.update_status(f"已加载历史记录: {record['time']}")
 
         except Exception as e:
             self.show_error(f"加载历史记录出错: {str(e)}")
 
-    def save_history(self):
-        try:
-            history_path = os.path.join(os.path.expanduser("~"), ".cad_segmentation_history.json")
-            with open(history_path, 'w', encoding='utf-8') as f:
-                json.dump(self.convert_to_python_types(self.history), f, ensure_ascii=False, indent=2)
-        except Exception as e:
-            print(f"保存历史记录出错: {str(e)}")
-
     def load_history(self):
+        """打开历史记录数据库，首次运行时导入旧版JSON历史文件"""
         try:
-            history_path = os.path.join(os.path.expanduser("~"), ".cad_segmentation_history.json")
-            if os.path.exists(history_path):
-                with open(history_path, 'r', encoding='utf-8') as f:
-                    self.history = json.load(f)
+            self.history_store = HistoryStore()
         except Exception as e:
-            print(f"加载历史记录出错: {str(e)}")
-            self.history = []
+            print(f"打开历史记录出错: {str(e)}")
+            self.history_store = None
+            return
+
+        if os.path.exists(LEGACY_HISTORY_PATH):
+            try:
+                _, skipped = self.history_store.import_json(LEGACY_HISTORY_PATH)
+                if skipped:
+                    print(f"旧版历史记录中有 {skipped} 条无效记录未导入")
+            except Exception as e:
+                print(f"导入旧版历史记录出错: {str(e)}")
 
     def closeEvent(self, event):
-        self.save_history()
+        if self.history_store is not None:
+            self.history_store.close()
+        self.logic.close()
         event.accept()
 
 